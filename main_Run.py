@@ -4,10 +4,10 @@ import cv2
 import csv
 import os
 import numpy as np
-from PIL import Image, ImageTk
 import pandas as pd
 import datetime
 import time
+from src.face_cache import FaceCache, cached_faces
 
 # Window is our Main frame of system
 window = tk.Tk()
@@ -652,6 +652,7 @@ def trainimg():
 
 
 def getImagesAndLabels(path):
+    cache = FaceCache("TrainingImageLabel/face_cache")
     imagePaths = [os.path.join(path, f) for f in os.listdir(path)]
     # create empth face list
     faceSamples = []
@@ -659,18 +660,11 @@ def getImagesAndLabels(path):
     Ids = []
     # now looping through all the image paths and loading the Ids and the images
     for imagePath in imagePaths:
-        # loading the image and converting it to gray scale
-        pilImage = Image.open(imagePath).convert('L')
-        # Now we are converting the PIL image into numpy array
-        imageNp = np.array(pilImage, 'uint8')
         # getting the Id from the image
-
         Id = int(os.path.split(imagePath)[-1].split(".")[1])
-        # extract the face from the training image sample
-        faces = detector.detectMultiScale(imageNp)
-        # If a face is there then append that in the list as well as Id of it
-        for (x, y, w, h) in faces:
-            faceSamples.append(imageNp[y:y + h, x:x + w])
+        # extract the face from the training image sample, reusing the crop cache when the file is unchanged
+        for face in cached_faces(imagePath, detector, cache):
+            faceSamples.append(face)
             Ids.append(Id)
     return faceSamples, Ids
 
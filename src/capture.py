@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import deque
+import cv2
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ImageDirectorySource:
+    # Plays a directory of still images (sorted by name) as if it were a camera
+    def __init__(self, path):
+        self.paths = [os.path.join(path, f) for f in sorted(os.listdir(path))
+                      if f.lower().endswith(IMAGE_EXTENSIONS)]
+        self._position = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        while self._position < len(self.paths):
+            img = cv2.imread(self.paths[self._position])
+            self._position += 1
+            if img is not None:
+                return True, img
+        return False, None
+
+    def release(self):
+        self._position = len(self.paths)
+
+
+def open_source(source):
+    # source: webcam index (int or digit string), video file, stream URL (rtsp://,
+    # http://, ...) or a directory of images. Returns an object with
+    # VideoCapture's read()/release()/isOpened().
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    if os.path.isdir(source):
+        return ImageDirectorySource(source)
+    return cv2.VideoCapture(source)
+
+
+def is_live_source(source):
+    # Live sources run at their own pace and may drop frames; recorded ones
+    # (files, image directories) are read frame by frame at processing speed.
+    if isinstance(source, int) or str(source).isdigit():
+        return True
+    return "://" in str(source)
+
+
+class FrameGrabber:
+    # Reads the camera on its own thread and keeps only the newest buffer_size frames.
+    # When recognition is slower than the camera, old frames are dropped here instead of
+    # queueing up in the driver, so the loop always works on (close to) the live image.
+    # From start() on the grabber owns the camera and releases it itself.
+    def __init__(self, cam, buffer_size=2):
+        self.cam = cam
+        self._frames = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._ended = False
+        self.captured = 0
+        self.consumed = 0
+        self.dropped = 0
+        # Age of the last frame handed out, i.e. how far behind live the loop is
+        self.last_latency = 0.0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            while self._running:
+                ret, img = self.cam.read()
+                with self._cond:
+                    if not ret:
+                        self._ended = True
+                        self._cond.notify_all()
+                        break
+                    if len(self._frames) == self._frames.maxlen:
+                        self.dropped += 1
+                    self.captured += 1
+                    self._frames.append((self.captured, time.monotonic(), img))
+                    self._cond.notify_all()
+        finally:
+            # Only after the last read() has returned: releasing a capture another
+            # thread is still reading from can crash the backend
+            self.cam.release()
+
+    def read(self, timeout=5.0):
+        # Same contract as VideoCapture.read(): (ret, frame). Returns the newest frame not
+        # handed out before; anything older still in the buffer is counted as dropped.
+        with self._cond:
+            deadline = time.monotonic() + timeout
+            while not self._frames and not self._ended:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, None
+                self._cond.wait(remaining)
+            if not self._frames:
+                return False, None
+            _, captured_at, img = self._frames[-1]
+            self.dropped += len(self._frames) - 1
+            self._frames.clear()
+            self.last_latency = time.monotonic() - captured_at
+            self.consumed += 1
+            return True, img
+
+    def stop(self):
+        # Waits up to 2 s for the thread to exit and release the camera. A thread still
+        # blocked in read() (e.g. a stalled stream) releases it as soon as that returns.
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def stats(self):
+        with self._cond:
+            return {"captured": self.captured, "consumed": self.consumed, "dropped": self.dropped,
+                    "last_latency": self.last_latency}
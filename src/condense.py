@@ -0,0 +1,109 @@
+import sys
+import time
+import numpy as np
+
+from src.lbph import NumpyLBPH
+
+
+def k_medoids(distances, k, iterations=20):
+    # Indices of k medoids for a square distance matrix. Deterministic: farthest-first
+    # initialisation from the most central point, then alternate assign / re-centre.
+    n = len(distances)
+    if k >= n:
+        return np.arange(n)
+    medoids = [int(np.argmin(distances.sum(axis=1)))]
+    while len(medoids) < k:
+        medoids.append(int(np.argmax(distances[:, medoids].min(axis=1))))
+    medoids = np.array(medoids)
+
+    for _ in range(iterations):
+        assignment = np.argmin(distances[:, medoids], axis=1)
+        updated = medoids.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members):
+                within = distances[np.ix_(members, members)].sum(axis=1)
+                updated[cluster] = members[np.argmin(within)]
+        if np.array_equal(np.sort(updated), np.sort(medoids)):
+            break
+        medoids = updated
+    return np.sort(medoids)
+
+
+def select_representatives(engine, max_per_identity):
+    # Gallery rows to keep: at most max_per_identity medoids per label of engine's gallery
+    keep = []
+    for label in np.unique(engine.labels):
+        rows = np.flatnonzero(engine.labels == label)
+        if len(rows) <= max_per_identity:
+            keep.extend(rows)
+            continue
+        distances = engine.distances(np.asarray(engine.histograms[rows]), gallery_rows=rows)
+        distances = (distances + distances.T) / 2
+        keep.extend(rows[k_medoids(distances, max_per_identity)])
+    return np.sort(np.array(keep, dtype=np.int64))
+
+
+def split_holdout(labels, holdout_fraction=0.2, seed=0):
+    # Per-identity split so every student is represented on both sides
+    rng = np.random.default_rng(seed)
+    train, holdout = [], []
+    for label in np.unique(labels):
+        rows = rng.permutation(np.flatnonzero(labels == label))
+        n_holdout = int(len(rows) * holdout_fraction)
+        if len(rows) < 2:
+            n_holdout = 0
+        holdout.extend(rows[:n_holdout])
+        train.extend(rows[n_holdout:])
+    return np.sort(np.array(train, dtype=np.int64)), np.sort(np.array(holdout, dtype=np.int64))
+
+
+def _evaluate(engine, queries, query_labels):
+    start = time.perf_counter()
+    labels, _ = engine.search(queries)
+    seconds = time.perf_counter() - start
+    accuracy = float(np.mean(labels[:, 0] == query_labels)) if len(query_labels) else 1.0
+    return accuracy, 1000 * seconds / max(1, len(query_labels))
+
+
+def condensation_report(faces, labels, sizes, holdout_fraction=0.2):
+    # Before/after gallery size, per-face search latency and held-out accuracy for each
+    # candidate cap in sizes, so the cap can be chosen from data.
+    labels = np.asarray(labels, dtype=np.int32)
+    engine = NumpyLBPH()
+    histograms = engine.compute_histograms(faces)
+    train, holdout = split_holdout(labels, holdout_fraction)
+    engine.set_gallery(histograms[train], labels[train])
+    queries, query_labels = histograms[holdout], labels[holdout]
+
+    accuracy, latency = _evaluate(engine, queries, query_labels)
+    reports = [{"max_per_identity": None, "gallery": len(train), "accuracy": accuracy, "ms_per_face": latency}]
+    for size in sizes:
+        keep = select_representatives(engine, size)
+        condensed = NumpyLBPH()
+        condensed.set_gallery(engine.histograms[keep], engine.labels[keep])
+        accuracy, latency = _evaluate(condensed, queries, query_labels)
+        reports.append({"max_per_identity": size, "gallery": len(keep), "accuracy": accuracy, "ms_per_face": latency})
+    return reports
+
+
+if __name__ == "__main__":
+    # python -m src.condense report 5 10 20   -> compare caps on a held-out split
+    # python -m src.condense apply 10         -> rebuild the model with at most 10 samples per student
+    # python -m src.condense apply 0          -> remove the cap and rebuild with every sample
+    from src.recognizer import FaceRecognizer
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ("report", "apply"):
+        print("usage: python -m src.condense report <M> [<M> ...] | apply <M>")
+        sys.exit(1)
+    recognizer = FaceRecognizer()
+    if sys.argv[1] == "apply":
+        # Stored in the manifest, later full rebuilds keep applying it
+        recognizer.max_samples_per_identity = int(sys.argv[2]) or None
+        print(recognizer.train_model(incremental=False))
+    else:
+        faces, labels = recognizer.load_training_data()
+        for report in condensation_report(faces, labels, [int(m) for m in sys.argv[2:]]):
+            cap = report["max_per_identity"] or "all"
+            print(f"cap {cap}: gallery {report['gallery']}, accuracy {report['accuracy']:.3f}, "
+                  f"{report['ms_per_face']:.2f} ms/face")
@@ -1,101 +1,477 @@
 import sqlite3
+import collections
+import contextlib
 import datetime
 import os
+import sys
+import threading
+import time
+
+ATTENDANCE_COLUMNS = ("id", "enrollment", "name", "subject", "date", "time")
 
 class DatabaseManager:
-    def __init__(self, db_path="data/attendance.db"):
+    # A small pool of connections shared by every thread: each call borrows one for its
+    # duration and hands it back, so callers that run on short-lived threads (Streamlit
+    # starts a new script thread per rerun) reuse connections instead of opening new
+    # ones, and at most pool_size are ever open. WAL lets readers run while a writer
+    # commits, and busy_timeout makes a writer wait for the lock instead of failing with
+    # "database is locked".
+    def __init__(self, db_path="data/attendance.db", busy_timeout=5.0, pool_size=4):
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        self._idle = []
+        self._waiters = collections.deque()
+        self._opened = 0
+        # Ensure data directory exists
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
         self._create_tables()
 
-    def _get_connection(self):
-        # Ensure data directory exists
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        return sqlite3.connect(self.db_path)
+    def _open_connection(self):
+        # check_same_thread=False: a pooled connection moves between threads, but only
+        # one call holds it at a time
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Durable across application crashes; only a power cut can lose the last commits
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _acquire(self):
+        # An idle connection, a new one while fewer than pool_size are open, or else wait
+        # for one to come back. Waiters are served in arrival order, so a busy reader
+        # loop cannot keep a writer waiting.
+        with self._pool_lock:
+            if self._idle and not self._waiters:
+                return self._idle.pop()
+            if self._opened < self.pool_size:
+                self._opened += 1
+                slot = None
+            else:
+                slot = [None, threading.Event()]
+                self._waiters.append(slot)
+        if slot is not None:
+            slot[1].wait()
+            return slot[0]
+        try:
+            return self._open_connection()
+        except Exception:
+            with self._pool_lock:
+                self._opened -= 1
+            raise
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            # Left open by a call that failed half-way; it would pin an old snapshot for
+            # the next borrower
+            conn.rollback()
+        with self._pool_lock:
+            if self._waiters:
+                slot = self._waiters.popleft()
+                slot[0] = conn
+                slot[1].set()
+            else:
+                self._idle.append(conn)
+
+    @contextlib.contextmanager
+    def _connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        # Closes the idle connections; later calls open new ones as needed
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            conn.close()
 
     def _create_tables(self):
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            cursor = conn.cursor()
         
-        # Table for registered students
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS students (
-                enrollment TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                registered_date TEXT,
-                registered_time TEXT
-            )
-        """)
+            # Table for registered students
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS students (
+                    enrollment TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    registered_date TEXT,
+                    registered_time TEXT
+                )
+            """)
+
+            # We will create dynamic tables for each subject/session or just one big attendance table?
+            # The original code created a new table for EVERY attendance session (Subject_Date_Time).
+            # That is bad practice. Better to have one Attendance table.
+        
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS attendance (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    enrollment TEXT,
+                    name TEXT,
+                    subject TEXT,
+                    date TEXT,
+                    time TEXT,
+                    FOREIGN KEY(enrollment) REFERENCES students(enrollment)
+                )
+            """)
 
-        # We will create dynamic tables for each subject/session or just one big attendance table?
-        # The original code created a new table for EVERY attendance session (Subject_Date_Time).
-        # That is bad practice. Better to have one Attendance table.
+            # Which students are expected in which subject; drives roster-aware sessions
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS subject_enrollments (
+                    subject TEXT NOT NULL,
+                    enrollment TEXT NOT NULL,
+                    PRIMARY KEY (subject, enrollment),
+                    FOREIGN KEY(enrollment) REFERENCES students(enrollment)
+                )
+            """)
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                enrollment TEXT,
-                name TEXT,
-                subject TEXT,
-                date TEXT,
-                time TEXT,
-                FOREIGN KEY(enrollment) REFERENCES students(enrollment)
+            conn.commit()
+            self._migrate(conn)
+
+    def _migrate(self, conn):
+        # Schema changes for databases created by older versions, tracked in user_version
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            with conn:
+                # One row per student, subject and day (a subject's session): drop the
+                # duplicates older versions inserted, keeping the first mark of the day
+                conn.execute("""
+                    DELETE FROM attendance WHERE id NOT IN (
+                        SELECT MIN(id) FROM attendance GROUP BY enrollment, subject, date)
+                """)
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_session "
+                             "ON attendance (enrollment, subject, date)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_subject_date ON attendance (subject, date)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_enrollment_date ON attendance (enrollment, date)")
+                conn.execute("PRAGMA user_version = 1")
+            version = 1
+        if version < 2:
+            with conn:
+                # Rows of one subject in id order, for keyset pagination of the log
+                # (every index ends in the rowid, i.e. id)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_subject ON attendance (subject)")
+                conn.execute("PRAGMA user_version = 2")
+            version = 2
+        if version < 3:
+            with conn:
+                self._create_summary_tables(conn)
+                conn.execute("PRAGMA user_version = 3")
+
+    def _create_summary_tables(self, conn):
+        # Aggregates behind the dashboard, kept current by triggers on attendance so every
+        # insert path (single, bulk, external tools) updates them. Dashboard queries then
+        # read O(days x subjects) and O(students x subjects) rows, never the raw log.
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_daily (
+                subject TEXT NOT NULL,
+                date TEXT NOT NULL,
+                present INTEGER NOT NULL,
+                PRIMARY KEY (subject, date)
             )
         """)
-        
-        conn.commit()
-        conn.close()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_student (
+                subject TEXT NOT NULL,
+                enrollment TEXT NOT NULL,
+                present INTEGER NOT NULL,
+                PRIMARY KEY (subject, enrollment)
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS attendance_summary_insert AFTER INSERT ON attendance
+            BEGIN
+                INSERT INTO attendance_daily (subject, date, present) VALUES (NEW.subject, NEW.date, 1)
+                    ON CONFLICT (subject, date) DO UPDATE SET present = present + 1;
+                INSERT INTO attendance_student (subject, enrollment, present) VALUES (NEW.subject, NEW.enrollment, 1)
+                    ON CONFLICT (subject, enrollment) DO UPDATE SET present = present + 1;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS attendance_summary_delete AFTER DELETE ON attendance
+            BEGIN
+                UPDATE attendance_daily SET present = present - 1
+                    WHERE subject = OLD.subject AND date = OLD.date;
+                DELETE FROM attendance_daily WHERE subject = OLD.subject AND date = OLD.date AND present <= 0;
+                UPDATE attendance_student SET present = present - 1
+                    WHERE subject = OLD.subject AND enrollment = OLD.enrollment;
+                DELETE FROM attendance_student
+                    WHERE subject = OLD.subject AND enrollment = OLD.enrollment AND present <= 0;
+            END
+        """)
+        # Existing history, counted once
+        conn.execute("DELETE FROM attendance_daily")
+        conn.execute("DELETE FROM attendance_student")
+        conn.execute("INSERT INTO attendance_daily SELECT subject, date, COUNT(*) FROM attendance GROUP BY subject, date")
+        conn.execute("""
+            INSERT INTO attendance_student SELECT subject, enrollment, COUNT(*)
+            FROM attendance GROUP BY subject, enrollment
+        """)
 
     def add_student(self, enrollment, name):
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            with self._connection() as conn:
+                cursor = conn.cursor()
             
-            ts = datetime.datetime.now()
-            date = ts.strftime('%Y-%m-%d')
-            time = ts.strftime('%H:%M:%S')
+                ts = datetime.datetime.now()
+                date = ts.strftime('%Y-%m-%d')
+                time = ts.strftime('%H:%M:%S')
             
-            cursor.execute("INSERT INTO students (enrollment, name, registered_date, registered_time) VALUES (?, ?, ?, ?)",
-                           (enrollment, name, date, time))
-            conn.commit()
-            return True, "Student registered successfully."
+                cursor.execute("INSERT INTO students (enrollment, name, registered_date, registered_time) VALUES (?, ?, ?, ?)",
+                               (enrollment, name, date, time))
+                conn.commit()
+                return True, "Student registered successfully."
+        # A failed insert is rolled back when the connection goes back to the pool
         except sqlite3.IntegrityError:
             return False, "Enrollment number already exists."
         except Exception as e:
             return False, str(e)
-        finally:
-            if 'conn' in locals(): conn.close()
+
+    def enroll_in_subjects(self, enrollment, subjects):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            with conn:
+                cursor.executemany("INSERT OR IGNORE INTO subject_enrollments (subject, enrollment) VALUES (?, ?)",
+                                   [(subject, enrollment) for subject in subjects])
+
+    def get_roster(self, subject):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT enrollment FROM subject_enrollments WHERE subject = ?", (subject,))
+            rows = [row[0] for row in cursor.fetchall()]
+            return rows
+
+    def get_rosters(self):
+        # subject -> enrolled students, for every subject with enrollments
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT subject, enrollment FROM subject_enrollments ORDER BY subject")
+            rosters = {}
+            for subject, enrollment in cursor.fetchall():
+                rosters.setdefault(subject, []).append(enrollment)
+            return rosters
 
     def mark_attendance(self, enrollment, name, subject):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        ts = datetime.datetime.now()
-        date = ts.strftime('%Y-%m-%d')
-        time = ts.strftime('%H:%M:%S')
-        
-        # Check if already marked for this subject today? 
-        # For simplicity, we just insert like the original code did (mostly).
-        # Original code filtered duplicates in memory before saving to CSV.
+        with self._connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute("INSERT INTO attendance (enrollment, name, subject, date, time) VALUES (?, ?, ?, ?, ?)",
-                       (enrollment, name, subject, date, time))
+            ts = datetime.datetime.now()
+            date = ts.strftime('%Y-%m-%d')
+            time = ts.strftime('%H:%M:%S')
         
-        conn.commit()
-        conn.close()
-        return date, time
+            # Marking the same student twice for a subject on one day is a no-op
+            with conn:
+                cursor.execute("INSERT OR IGNORE INTO attendance (enrollment, name, subject, date, time) VALUES (?, ?, ?, ?, ?)",
+                               (enrollment, name, subject, date, time))
+            return date, time
+
+    def mark_attendance_bulk(self, subject, enrollments):
+        # Marks every recognized student of a session in one transaction: names come from
+        # one query, rows go in with one commit. Enrollments that are not registered
+        # students are skipped, students already marked today are left as they are.
+        # Returns the (enrollment, name) pairs marked by this call, so already-present
+        # students are not counted twice.
+        enrollments = list(dict.fromkeys(str(e) for e in enrollments))
+        with self._connection() as conn:
+            cursor = conn.cursor()
+
+            names = {}
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(enrollments), 500):
+                chunk = enrollments[i:i + 500]
+                cursor.execute("SELECT enrollment, name FROM students WHERE enrollment IN ({})"
+                               .format(",".join("?" * len(chunk))), chunk)
+                names.update(cursor.fetchall())
+            resolved = [(e, names[e]) for e in enrollments if e in names]
+
+            ts = datetime.datetime.now()
+            date = ts.strftime('%Y-%m-%d')
+            time = ts.strftime('%H:%M:%S')
+            marked = []
+            with conn:
+                # Row by row inside the one transaction: rowcount tells a new mark from one
+                # the unique session index ignored, which executemany cannot
+                for e, name in resolved:
+                    cursor.execute("INSERT OR IGNORE INTO attendance (enrollment, name, subject, date, time) VALUES (?, ?, ?, ?, ?)",
+                                   (e, name, subject, date, time))
+                    if cursor.rowcount == 1:
+                        marked.append((e, name))
+            return marked
 
     def get_student_details(self):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT enrollment, name, registered_date, registered_time FROM students")
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT enrollment, name, registered_date, registered_time FROM students")
+            rows = cursor.fetchall()
+            return rows
 
     def get_attendance_log(self, subject):
-        conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM attendance WHERE subject = ?", (subject,))
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM attendance WHERE subject = ?", (subject,))
+            rows = cursor.fetchall()
+            return rows
+
+    def get_attendance_page(self, subject=None, after_id=0, limit=100, columns=None,
+                            start_date=None, end_date=None, enrollment=None):
+        # One page of the log in id order, starting after after_id. Keyset pagination:
+        # each page is an index seek, however deep into the history it is. Dates are
+        # 'YYYY-MM-DD' and inclusive. Returns (rows, next_after_id); next_after_id is None
+        # on the last page.
+        columns = list(columns or ATTENDANCE_COLUMNS)
+        unknown = [c for c in columns if c not in ATTENDANCE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown attendance columns: {unknown}")
+
+        clauses, params = ["id > ?"], [after_id]
+        for clause, value in (("subject = ?", subject), ("enrollment = ?", enrollment),
+                              ("date >= ?", start_date), ("date <= ?", end_date)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        # id always comes first, it is the cursor; one extra row tells if there is more
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, {} FROM attendance WHERE {} ORDER BY id LIMIT ?"
+                           .format(", ".join(columns), " AND ".join(clauses)), params + [limit + 1])
+            rows = cursor.fetchall()
+
+            next_after_id = rows[limit - 1][0] if len(rows) > limit else None
+            return [row[1:] for row in rows[:limit]], next_after_id
+
+    def iter_attendance_log(self, subject=None, columns=None, chunk_size=500, **filters):
+        # Streams the log chunk by chunk (same filters as get_attendance_page), so memory
+        # stays at one chunk no matter how long the history is
+        after_id = 0
+        while after_id is not None:
+            rows, after_id = self.get_attendance_page(subject, after_id, chunk_size, columns, **filters)
+            yield from rows
+
+    def get_daily_counts(self, subject=None, start_date=None, end_date=None):
+        # (date, subject, present) per day a subject was held, oldest first
+        clauses, params = ["1 = 1"], []
+        for clause, value in (("subject = ?", subject), ("date >= ?", start_date), ("date <= ?", end_date)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT date, subject, present FROM attendance_daily WHERE {} ORDER BY date, subject"
+                           .format(" AND ".join(clauses)), params)
+            return cursor.fetchall()
+
+    def get_student_attendance(self, subject):
+        # (enrollment, name, attended, sessions, percentage) for each student enrolled in
+        # or marked in subject; a session is a day the subject has any attendance
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                WITH sessions AS (SELECT COUNT(*) AS held FROM attendance_daily WHERE subject = :subject),
+                     members AS (
+                        SELECT enrollment FROM subject_enrollments WHERE subject = :subject
+                        UNION
+                        SELECT enrollment FROM attendance_student WHERE subject = :subject)
+                SELECT m.enrollment, COALESCE(s.name, ''), COALESCE(a.present, 0), sessions.held,
+                       ROUND(100.0 * COALESCE(a.present, 0) / MAX(sessions.held, 1), 1)
+                FROM members m
+                CROSS JOIN sessions
+                LEFT JOIN attendance_student a ON a.subject = :subject AND a.enrollment = m.enrollment
+                LEFT JOIN students s ON s.enrollment = m.enrollment
+                ORDER BY m.enrollment
+            """, {"subject": subject})
+            return cursor.fetchall()
+
+    def get_attendance_trend(self, subject=None, days=30, window=7):
+        # (date, present, moving_average) over the last `days` days with attendance, the
+        # average taken over the previous `window` of those days
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT date, present, ROUND(AVG(present) OVER (ORDER BY date ROWS BETWEEN ? PRECEDING AND CURRENT ROW), 2)
+                FROM (
+                    SELECT date, SUM(present) AS present FROM attendance_daily
+                    WHERE ? IS NULL OR subject = ?
+                    GROUP BY date ORDER BY date DESC LIMIT ?)
+                ORDER BY date
+            """, (window - 1, subject, subject, days))
+            return cursor.fetchall()
+
+    def get_subjects(self):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT subject FROM attendance_daily UNION SELECT subject FROM subject_enrollments ORDER BY 1")
+            return [row[0] for row in cursor.fetchall()]
+
+
+def benchmark_concurrency(db_path, readers=8, writers=4, seconds=5.0, subject="BENCH"):
+    # Reader and writer threads hammering one shared DatabaseManager (and its pool), the way Streamlit
+    # sessions and recognition sessions share the module-level db. Returns throughput,
+    # latency percentiles per side and how many calls failed with a lock error.
+    db = DatabaseManager(db_path)
+    for n in range(writers):
+        db.add_student(str(n), f"Student {n}")
+        db.enroll_in_subjects(str(n), [subject])
+    stop = threading.Event()
+    latencies = {"read": [], "write": []}
+    errors = []
+    lock = threading.Lock()
+
+    def worker(kind, n):
+        local, i = [], 0
+        try:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    if kind == "write":
+                        db.mark_attendance(str(n), f"Student {n}", f"{subject}-{i}")
+                    else:
+                        db.get_roster(subject)
+                        db.get_student_details()
+                except sqlite3.OperationalError as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                local.append(time.perf_counter() - start)
+                i += 1
+        finally:
+            with lock:
+                latencies[kind].extend(local)
+
+    threads = [threading.Thread(target=worker, args=("read", n)) for n in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", n)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    db.close()
+
+    report = {"readers": readers, "writers": writers, "seconds": seconds, "lock_errors": len(errors)}
+    for kind, values in latencies.items():
+        values.sort()
+        report[kind] = {
+            "ops": len(values),
+            "ops_per_second": len(values) / seconds,
+            "p50_ms": 1000 * values[len(values) // 2] if values else None,
+            "p95_ms": 1000 * values[int(len(values) * 0.95)] if values else None,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    # python -m src.database benchmark [readers] [writers] [seconds]
+    # Runs against a throw-away database, never data/attendance.db
+    import tempfile
+
+    if len(sys.argv) < 2 or sys.argv[1] != "benchmark":
+        print("usage: python -m src.database benchmark [readers] [writers] [seconds]")
+        sys.exit(1)
+    readers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    writers = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 5.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(benchmark_concurrency(os.path.join(tmp_dir, "bench.db"), readers, writers, seconds))
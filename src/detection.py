@@ -0,0 +1,123 @@
+import math
+import sys
+import time
+import cv2
+
+from src.capture import open_source
+from src.tracking import iou
+
+
+class FaceDetector:
+    # Haar detection stage for the recognition loop. Detection runs on an optional
+    # region of interest (e.g. the seating area) downscaled by `scale`, and boxes are
+    # mapped back to full-resolution coordinates so prediction still gets full-res crops.
+    # min_size / max_size are full-resolution pixels; see face_size_range().
+    def __init__(self, cascade, scale=1.0, scale_factor=1.2, min_neighbors=5,
+                 min_size=None, max_size=None, roi=None):
+        self.cascade = cascade
+        self.scale = scale
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.max_size = max_size
+        # (x, y, w, h) in full-resolution pixels, None for the whole frame
+        self.roi = roi
+
+    def _scaled_size(self, size):
+        if size is None:
+            return None
+        side = max(1, int(round(size * self.scale)))
+        return (side, side)
+
+    def detect(self, gray):
+        rows, cols = gray.shape[:2]
+        ox, oy = 0, 0
+        if self.roi is not None:
+            x, y, w, h = self.roi
+            ox, oy = max(0, x), max(0, y)
+            gray = gray[oy:min(rows, y + h), ox:min(cols, x + w)]
+            if gray.size == 0:
+                return []
+
+        small = gray
+        if self.scale != 1.0:
+            small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+        kwargs = {}
+        if self.min_size is not None:
+            kwargs["minSize"] = self._scaled_size(self.min_size)
+        if self.max_size is not None:
+            kwargs["maxSize"] = self._scaled_size(self.max_size)
+        faces = self.cascade.detectMultiScale(small, self.scale_factor, self.min_neighbors, **kwargs)
+
+        boxes = []
+        for (x, y, w, h) in faces:
+            x0 = min(cols - 1, ox + int(x / self.scale))
+            y0 = min(rows - 1, oy + int(y / self.scale))
+            x1 = min(cols, ox + int(math.ceil((x + w) / self.scale)))
+            y1 = min(rows, oy + int(math.ceil((y + h) / self.scale)))
+            boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+
+def face_size_range(frame_width, horizontal_fov_deg, nearest_m, farthest_m, face_width_m=0.16):
+    # Expected face widths in pixels for a pinhole camera: students sitting between
+    # nearest_m and farthest_m from a camera with the given horizontal field of view.
+    # Returns (min_size, max_size) for FaceDetector, with some slack either side.
+    focal_px = (frame_width / 2) / math.tan(math.radians(horizontal_fov_deg) / 2)
+    min_size = int(focal_px * face_width_m / farthest_m * 0.8)
+    max_size = int(math.ceil(focal_px * face_width_m / nearest_m * 1.25))
+    return max(1, min_size), max_size
+
+
+def _recall(reference, boxes, min_iou=0.5):
+    if not reference:
+        return 1.0
+    found = sum(1 for ref in reference if any(iou(ref, box) >= min_iou for box in boxes))
+    return found / len(reference)
+
+
+def benchmark_detection(cascade, frames, scales=(1.0, 0.75, 0.5, 0.33), reference=None, **detector_kwargs):
+    # Detection time per frame and recall at each scale. Without ground-truth boxes
+    # (reference: one list of boxes per frame) full-resolution detections are the reference.
+    if reference is None:
+        full = FaceDetector(cascade, 1.0, **detector_kwargs)
+        reference = [full.detect(gray) for gray in frames]
+
+    reports = []
+    for scale in scales:
+        detector = FaceDetector(cascade, scale, **detector_kwargs)
+        recalls = []
+        start = time.perf_counter()
+        detections = [detector.detect(gray) for gray in frames]
+        elapsed = time.perf_counter() - start
+        for ref, boxes in zip(reference, detections):
+            recalls.append(_recall(ref, boxes))
+        reports.append({
+            "scale": scale,
+            "ms_per_frame": 1000 * elapsed / max(1, len(frames)),
+            "recall": sum(recalls) / len(recalls) if recalls else 1.0,
+            "faces": sum(len(boxes) for boxes in detections),
+        })
+    return reports
+
+
+if __name__ == "__main__":
+    # python -m src.detection <camera index | video | url | image dir> [max_frames]
+    if len(sys.argv) < 2:
+        print("usage: python -m src.detection <source> [max_frames]")
+        sys.exit(1)
+    max_frames = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    source = open_source(sys.argv[1])
+    frames = []
+    while len(frames) < max_frames:
+        ret, img = source.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    source.release()
+
+    cascade = cv2.CascadeClassifier("resources/haarcascade_frontalface_default.xml")
+    for report in benchmark_detection(cascade, frames):
+        print(f"scale {report['scale']:.2f}: {report['ms_per_frame']:.1f} ms/frame, "
+              f"recall {report['recall']:.3f}, {report['faces']} faces")
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import uuid
+import numpy as np
+from PIL import Image
+
+
+class FaceCache:
+    # Decoded + detected face crops keyed by the SHA-1 of the source image bytes,
+    # so unchanged training files never go through JPEG decode / detectMultiScale twice.
+    def __init__(self, cache_dir="data/models/face_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_key(path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npz")
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with np.load(entry_path) as data:
+                return [data[f"face_{i}"] for i in range(int(data["count"]))]
+        except Exception:
+            # Truncated or foreign file, treat as a miss and let it be rewritten
+            return None
+
+    def put(self, key, faces):
+        # Best effort: a failed write only costs a re-detection next time. Identical images
+        # in different ingest workers write the same entry, so each writer gets its own
+        # temp file and the last os.replace wins.
+        entry_path = self._entry_path(key)
+        arrays = {f"face_{i}": np.ascontiguousarray(face, dtype=np.uint8) for i, face in enumerate(faces)}
+        tmp_path = f"{entry_path}.{os.getpid()}-{uuid.uuid4().hex}.tmp.npz"
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            np.savez(tmp_path, count=len(faces), **arrays)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print(f"Could not cache faces for {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def extract_faces(image_path, detector):
+    pil_image = Image.open(image_path).convert('L')
+    image_np = np.array(pil_image, 'uint8')
+    faces = detector.detectMultiScale(image_np)
+    return [image_np[y:y+h, x:x+w] for (x, y, w, h) in faces]
+
+
+def cached_faces(image_path, detector, cache=None):
+    if cache is None:
+        return extract_faces(image_path, detector)
+
+    key = cache.file_key(image_path)
+    faces = cache.get(key)
+    if faces is None:
+        faces = extract_faces(image_path, detector)
+        cache.put(key, faces)
+    return faces
+
+
+def load_training_faces(image_paths, detector, cache=None):
+    # Expects filename format: Name.Enrollment.SampleNum.jpg
+    face_samples = []
+    ids = []
+    for image_path in image_paths:
+        try:
+            id = int(os.path.split(image_path)[-1].split(".")[1])
+            for face in cached_faces(image_path, detector, cache):
+                face_samples.append(face)
+                ids.append(id)
+        except Exception as e:
+            print(f"Skipping file {image_path}: {e}")
+    return face_samples, ids
@@ -0,0 +1,111 @@
+import os
+import time
+import numpy as np
+
+from src.lbph import NumpyLBPH
+
+
+class CentroidIndex:
+    # Two-stage gallery search for large enrollments. Each identity is summarised by the
+    # mean of its histograms; a query is first compared against those centroids (cheap
+    # matrix products, one row per student instead of one per sample) and only the
+    # samples of the n_probe closest identities are re-ranked with the exact distance.
+    #
+    # n_probe is the recall/speed knob: 1 is fastest, len(identities) is exhaustive.
+    def __init__(self, centroids, identities, order, offsets, gallery_size, n_probe=8):
+        self.identities = np.asarray(identities, dtype=np.int32)
+        # Gallery rows sorted by identity; rows of identity i are order[offsets[i]:offsets[i + 1]]
+        self.order = np.asarray(order, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.gallery_size = int(gallery_size)
+        self.n_probe = n_probe
+        self._coarse = NumpyLBPH(metric="chisqr")
+        self._coarse.set_gallery(centroids, self.identities)
+
+    @property
+    def centroids(self):
+        return self._coarse.histograms
+
+    @classmethod
+    def build(cls, engine, n_probe=8):
+        identities, inverse = np.unique(engine.labels, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        offsets = np.searchsorted(inverse[order], np.arange(len(identities) + 1))
+        centroids = np.empty((len(identities), engine.histograms.shape[1]), dtype=np.float32)
+        for i in range(len(identities)):
+            centroids[i] = engine.histograms[order[offsets[i]:offsets[i + 1]]].mean(axis=0)
+        return cls(centroids, identities, order, offsets, len(engine.labels), n_probe)
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, identities=self.identities, order=self.order,
+                 offsets=self.offsets, gallery_size=self.gallery_size, n_probe=self.n_probe)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, n_probe=None):
+        with np.load(path) as data:
+            return cls(data["centroids"], data["identities"], data["order"], data["offsets"],
+                       int(data["gallery_size"]), n_probe or int(data["n_probe"]))
+
+    def matches(self, engine):
+        # An index built for another version of the model must not be used: same size is
+        # not enough, every row has to belong to the identity the index files it under
+        if self.gallery_size != len(engine.labels):
+            return False
+        expected = np.repeat(self.identities, np.diff(self.offsets))
+        return bool(np.array_equal(np.asarray(engine.labels)[self.order], expected))
+
+    def candidate_rows(self, queries, allowed=None):
+        # Gallery rows worth re-ranking for each query histogram.
+        # allowed optionally restricts the search to a set of identities.
+        coarse = self._coarse.distances(queries)
+        if allowed is not None:
+            coarse[:, ~np.isin(self.identities, list(allowed))] = np.inf
+        n_probe = min(self.n_probe, len(self.identities))
+        nearest = np.argpartition(coarse, n_probe - 1, axis=1)[:, :n_probe]
+        candidates = []
+        for query_nearest, query_coarse in zip(nearest, coarse):
+            ids = [i for i in query_nearest if np.isfinite(query_coarse[i])]
+            if ids:
+                candidates.append(np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in ids]))
+            else:
+                candidates.append(np.empty(0, dtype=np.int64))
+        return candidates
+
+    def search(self, engine, queries, k=1, allowed=None):
+        # Drop-in for engine.search(): (labels, distances), both (n, k), best match first
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int32)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        for i, rows in enumerate(self.candidate_rows(queries, allowed)):
+            query_labels, query_distances = engine.search(queries[i:i + 1], k, gallery_rows=rows)
+            labels[i] = query_labels[0]
+            distances[i] = query_distances[0]
+        return labels, distances
+
+    def predict_batch(self, engine, faces, k=1, allowed=None):
+        if not faces:
+            return np.empty((0, k), dtype=np.int32), np.empty((0, k), dtype=np.float32)
+        return self.search(engine, engine.compute_histograms(faces), k, allowed)
+
+
+def measure_recall(engine, index, queries, k=1):
+    # Fraction of queries whose indexed top-1 label equals the exhaustive top-1 label,
+    # plus wall-clock for both, so n_probe can be picked from data.
+    start = time.perf_counter()
+    exact_labels, _ = engine.search(queries, k)
+    exhaustive_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_labels, _ = index.search(engine, queries, k)
+    index_seconds = time.perf_counter() - start
+
+    recall = float(np.mean(exact_labels[:, 0] == index_labels[:, 0])) if len(queries) else 1.0
+    return {
+        "n_probe": index.n_probe,
+        "recall": recall,
+        "exhaustive_seconds": exhaustive_seconds,
+        "index_seconds": index_seconds,
+        "speedup": exhaustive_seconds / index_seconds if index_seconds > 0 else float("inf"),
+    }
@@ -11,6 +11,7 @@ import time
 
 from src.database import DatabaseManager
 from src.recognizer import FaceRecognizer
+from src.train_watcher import TrainingWatcher
 
 class AttendanceApp:
     def __init__(self, root):
@@ -21,6 +22,9 @@ class AttendanceApp:
         
         self.db = DatabaseManager()
         self.recognizer = FaceRecognizer()
+        # Optional background training, toggled by the "Auto-train" checkbox
+        self.watcher = TrainingWatcher(self.recognizer, rosters=self.db.get_rosters)
+        self._watcher_updates = 0
 
         self._build_ui()
 
@@ -59,6 +63,11 @@ class AttendanceApp:
         tk.Button(self.root, text="Train Images", command=self.train_images, fg="black", bg="SkyBlue1", 
                   width=20, height=3, font=('times', 15, 'bold')).place(x=400, y=500)
         
+        self.auto_train = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Auto-train new samples", variable=self.auto_train,
+                       command=self.toggle_auto_train, bg="grey80",
+                       font=('times', 12)).place(x=430, y=590)
+        
         tk.Button(self.root, text="Automatic Attendance", command=self.automatic_attendance, fg="black", bg="SkyBlue1", 
                   width=20, height=3, font=('times', 15, 'bold')).place(x=700, y=500)
 
@@ -102,12 +111,31 @@ class AttendanceApp:
         
         success, msg = self.recognizer.train_model()
         if success:
+            self.recognizer.train_subject_models(self.db.get_rosters())
             self.update_status("Model Trained Successfully", "Green")
             messagebox.showinfo("Success", msg)
         else:
             self.update_status("Training Failed", "Red")
             messagebox.showerror("Error", msg)
 
+    def toggle_auto_train(self):
+        if self.auto_train.get():
+            self.watcher.start()
+            self.update_status("Auto-training On", "Green")
+            self.root.after(1000, self._poll_watcher)
+        else:
+            self.watcher.stop()
+            self.update_status("Auto-training Off", "Green")
+
+    def _poll_watcher(self):
+        # Tk widgets belong to the UI thread, so the watcher's results are polled here
+        if not self.watcher.running:
+            return
+        if self.watcher.updates != self._watcher_updates:
+            self._watcher_updates = self.watcher.updates
+            self.update_status("Model Updated", "Green")
+        self.root.after(1000, self._poll_watcher)
+
     def automatic_attendance(self):
         subject = simpledialog.askstring("Input", "Enter Subject Name:")
         if not subject:
@@ -116,25 +144,18 @@ class AttendanceApp:
         self.update_status("Taking Attendance...", "Yellow")
         self.root.update()
         
-        present_ids = self.recognizer.recognize_face()
+        # Students enrolled in this subject, if any were recorded: limits matching to the
+        # class (through the subject's model shard) and lets the session stop on its own
+        # once everyone has been seen
+        roster = self.db.get_roster(subject)
+        present_ids = self.recognizer.recognize_face(roster=roster or None, subject=subject)
         if not present_ids:
              self.update_status("No faces recognized", "Red")
              return
 
-        conn = self.db._get_connection()
-        cursor = conn.cursor()
-        
-        count = 0
-        for enrollment in present_ids:
-            # Get name
-            cursor.execute("SELECT name FROM students WHERE enrollment=?", (enrollment,))
-            res = cursor.fetchone()
-            if res:
-                name = res[0]
-                self.db.mark_attendance(enrollment, name, subject)
-                count += 1
+        # Whole class in one transaction
+        count = len(self.db.mark_attendance_bulk(subject, present_ids))
         
-        conn.close()
         self.update_status(f"Attendance Marked for {count} students", "Green")
         messagebox.showinfo("Success", f"Attendance marked for {count} students.")
 
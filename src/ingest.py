@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import time
+import cv2
+from concurrent.futures import ProcessPoolExecutor
+
+from src.face_cache import FaceCache, load_training_faces
+
+# Per-process state, set up once by _init_worker
+_detector = None
+_cache = None
+
+
+class IngestStats:
+    def __init__(self, images, faces, workers, seconds):
+        self.images = images
+        self.faces = faces
+        self.workers = workers
+        self.seconds = seconds
+
+    @property
+    def images_per_second(self):
+        return self.images / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.images} images -> {self.faces} faces in {self.seconds:.2f}s "
+                f"({self.images_per_second:.1f} img/s, {self.workers} workers)")
+
+
+def _init_worker(cascade_path, cache_dir):
+    global _detector, _cache
+    # One process per core already, don't let OpenCV oversubscribe on top of that
+    cv2.setNumThreads(1)
+    _detector = cv2.CascadeClassifier(cascade_path)
+    _cache = FaceCache(cache_dir) if cache_dir else None
+
+
+def _load_shard(image_paths):
+    return load_training_faces(image_paths, _detector, _cache)
+
+
+def _shards(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def ingest_training_images(image_paths, cascade_path, cache_dir=None, workers=None, shard_size=32):
+    # Returns (face_samples, ids, stats); samples come back in the order of image_paths
+    # regardless of how many workers were used, so training is reproducible.
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    if workers == 1 or len(image_paths) <= shard_size:
+        detector = cv2.CascadeClassifier(cascade_path)
+        cache = FaceCache(cache_dir) if cache_dir else None
+        face_samples, ids = load_training_faces(image_paths, detector, cache)
+        workers = 1
+    else:
+        face_samples = []
+        ids = []
+        # Spawned, not forked: the caller may be the GUI, Streamlit or the training
+        # watcher, and forking a process that has threads (and OpenCV's thread pool)
+        # running can deadlock the child
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cascade_path, cache_dir),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            for shard_faces, shard_ids in pool.map(_load_shard, _shards(image_paths, shard_size)):
+                face_samples.extend(shard_faces)
+                ids.extend(shard_ids)
+
+    stats = IngestStats(len(image_paths), len(ids), workers, time.perf_counter() - start)
+    return face_samples, ids, stats
@@ -0,0 +1,213 @@
+import numpy as np
+
+EPS = np.finfo(np.float32).eps
+# Scratch size for chisqr_alt, in float32 elements (16 MB per buffer)
+BLOCK_ELEMENTS = 1 << 22
+
+
+class NumpyLBPH:
+    # Batch counterpart of cv2.face.LBPHFaceRecognizer. Histograms are computed the same
+    # way (extended circular LBP + spatial histograms) so a gallery can be shared with an
+    # OpenCV model in either direction, but the gallery lives in one float32 matrix and a
+    # whole frame worth of faces is scored against it at once.
+    #
+    # metric="chisqr_alt" reproduces the distance OpenCV's predict() returns, so existing
+    # thresholds like conf < 100 keep their meaning. metric="chisqr" is the plain
+    # chi-square, which reduces to matrix products and is much faster on big galleries,
+    # but its distances are on a different scale.
+    def __init__(self, radius=1, neighbors=8, grid_x=8, grid_y=8, metric="chisqr_alt"):
+        if metric not in ("chisqr_alt", "chisqr"):
+            raise ValueError(f"Unknown metric: {metric}")
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.metric = metric
+        self.histograms = np.empty((0, self.feature_size), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.int32)
+        # Lazily built scoring layouts: transposed gallery for chisqr_alt, 1/g for chisqr
+        self._gallery_t = None
+        self._gallery_sum = None
+        self._inv_gallery = None
+
+    @property
+    def feature_size(self):
+        return self.grid_x * self.grid_y * (1 << self.neighbors)
+
+    @classmethod
+    def from_opencv(cls, recognizer, **kwargs):
+        engine = cls(recognizer.getRadius(), recognizer.getNeighbors(),
+                     recognizer.getGridX(), recognizer.getGridY(), **kwargs)
+        histograms = recognizer.getHistograms()
+        if histograms:
+            engine.set_gallery(np.vstack([h.reshape(1, -1) for h in histograms]),
+                               recognizer.getLabels().ravel())
+        return engine
+
+    def _lbp_codes(self, images):
+        # images: (n, h, w) -> (n, h - 2r, w - 2r) LBP codes, same sampling as OpenCV's elbp()
+        images = images.astype(np.float32)
+        n, rows, cols = images.shape
+        r = self.radius
+        out_rows, out_cols = rows - 2 * r, cols - 2 * r
+        center = images[:, r:r + out_rows, r:r + out_cols]
+        codes = np.zeros((n, out_rows, out_cols), dtype=np.int32)
+
+        for k in range(self.neighbors):
+            x = float(np.float32(r * np.cos(2.0 * np.pi * k / self.neighbors)))
+            y = float(np.float32(-r * np.sin(2.0 * np.pi * k / self.neighbors)))
+            fx, fy = int(np.floor(x)), int(np.floor(y))
+            cx, cy = int(np.ceil(x)), int(np.ceil(y))
+            tx, ty = x - fx, y - fy
+            w1 = np.float32((1 - tx) * (1 - ty))
+            w2 = np.float32(tx * (1 - ty))
+            w3 = np.float32((1 - tx) * ty)
+            w4 = np.float32(tx * ty)
+
+            def shifted(dy, dx):
+                return images[:, r + dy:r + dy + out_rows, r + dx:r + dx + out_cols]
+
+            t = (w1 * shifted(fy, fx) + w2 * shifted(fy, cx) +
+                 w3 * shifted(cy, fx) + w4 * shifted(cy, cx))
+            codes |= (((t > center) | (np.abs(t - center) < EPS)).astype(np.int32) << k)
+        return codes
+
+    def _spatial_histograms(self, codes):
+        n, rows, cols = codes.shape
+        bins = 1 << self.neighbors
+        cell_w = cols // self.grid_x
+        cell_h = rows // self.grid_y
+        hist = np.zeros((n, self.grid_y * self.grid_x, bins), dtype=np.float32)
+        if cell_w == 0 or cell_h == 0:
+            return hist.reshape(n, -1)
+
+        # Crop to whole cells, then give every (image, cell) pair its own block of bins
+        cells = codes[:, :cell_h * self.grid_y, :cell_w * self.grid_x]
+        cells = cells.reshape(n, self.grid_y, cell_h, self.grid_x, cell_w).transpose(0, 1, 3, 2, 4)
+        cells = cells.reshape(n, self.grid_y * self.grid_x, cell_h * cell_w)
+        offsets = (np.arange(n * self.grid_y * self.grid_x) * bins).reshape(n, -1, 1)
+        counts = np.bincount((cells + offsets).ravel(), minlength=hist.size)
+        hist = counts.reshape(hist.shape).astype(np.float32) / np.float32(cell_h * cell_w)
+        return hist.reshape(n, -1)
+
+    def compute_histograms(self, faces):
+        # faces: list of 2D uint8 crops, any sizes. Crops of equal shape are processed as
+        # one stacked batch, which is the common case for detector output.
+        result = np.empty((len(faces), self.feature_size), dtype=np.float32)
+        by_shape = {}
+        for i, face in enumerate(faces):
+            by_shape.setdefault(face.shape, []).append(i)
+        for indices in by_shape.values():
+            batch = np.stack([faces[i] for i in indices])
+            result[indices] = self._spatial_histograms(self._lbp_codes(batch))
+        return result
+
+    def set_gallery(self, histograms, labels):
+        self.histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self._gallery_t = None
+        self._gallery_sum = None
+        self._inv_gallery = None
+
+    def set_gallery_transposed(self, gallery_t, labels):
+        # gallery_t: (feature_size, n) float32, the layout chisqr_alt scans. Used as-is
+        # (no copy), so a memory-mapped array stays shared between processes.
+        if gallery_t.dtype != np.float32 or not gallery_t.flags.c_contiguous:
+            gallery_t = np.ascontiguousarray(gallery_t, dtype=np.float32)
+        self.histograms = gallery_t.T
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self._gallery_t = gallery_t
+        self._gallery_sum = None
+        self._inv_gallery = None
+
+    def train(self, faces, labels):
+        self.set_gallery(self.compute_histograms(faces), labels)
+
+    def update(self, faces, labels):
+        self.set_gallery(np.vstack([self.histograms, self.compute_histograms(faces)]),
+                         np.concatenate([self.labels, np.asarray(labels, dtype=np.int32).ravel()]))
+
+    def _chisqr_alt(self, queries, gallery_rows=None):
+        # OpenCV HISTCMP_CHISQR_ALT: 2 * sum((q - g)^2 / (q + g)) over bins with q + g > 0.
+        # Rewritten as 2 * (sum(q) + sum(g) - 4 * sum(q * g / (q + g))), where the last sum
+        # only has terms on the query's non-zero bins; a face histogram has roughly one
+        # in six bins set, so only those rows of the (bins, gallery) matrix are touched.
+        if self._gallery_t is None:
+            self._gallery_t = np.ascontiguousarray(self.histograms.T)
+        if self._gallery_sum is None:
+            self._gallery_sum = self._gallery_t.sum(axis=0, dtype=np.float64)
+        if gallery_rows is not None:
+            gallery_rows = np.asarray(gallery_rows)
+        gallery_sum = self._gallery_sum if gallery_rows is None else self._gallery_sum[gallery_rows]
+        n_gallery = len(gallery_sum)
+        distances = np.empty((len(queries), n_gallery), dtype=np.float32)
+        # The gallery is scanned in column blocks of at most BLOCK_ELEMENTS values, one
+        # gathered block plus a reused scratch buffer for q + g, so peak memory stays
+        # bounded whatever the gallery size
+        size = max(BLOCK_ELEMENTS, self.feature_size)
+        scratch = np.empty(size, dtype=np.float32)
+        cross = np.empty(n_gallery, dtype=np.float64)
+        for i, query in enumerate(queries):
+            cols = np.flatnonzero(query > EPS)
+            q = query[cols, None]
+            width = max(1, size // max(1, len(cols)))
+            for start in range(0, n_gallery, width):
+                stop = min(n_gallery, start + width)
+                if gallery_rows is None:
+                    g = self._gallery_t[cols, start:stop]
+                else:
+                    g = self._gallery_t[np.ix_(cols, gallery_rows[start:stop])]
+                total = scratch[:g.size].reshape(g.shape)
+                np.add(g, q, out=total)
+                np.multiply(g, q, out=g)
+                np.divide(g, total, out=g)
+                # Sums in float64: the expression cancels to ~0 for near-identical faces
+                cross[start:stop] = g.sum(axis=0, dtype=np.float64)
+            distances[i] = 2 * (query.sum(dtype=np.float64) + gallery_sum - 4 * cross)
+        return np.maximum(distances, 0, out=distances)
+
+    def _chisqr(self, queries):
+        # OpenCV HISTCMP_CHISQR with the gallery as the first histogram:
+        # sum over g > 0 of (q - g)^2 / g = q^2 . (1/g) - 2 q . [g > 0] + sum(g)
+        if self._inv_gallery is None:
+            mask = self.histograms > EPS
+            inv = np.zeros_like(self.histograms)
+            np.divide(1.0, self.histograms, out=inv, where=mask)
+            self._inv_gallery = (inv, mask.astype(np.float32), self.histograms.sum(axis=1))
+        inv, mask, gallery_sum = self._inv_gallery
+        distances = (queries * queries) @ inv.T - 2 * (queries @ mask.T) + gallery_sum
+        return np.maximum(distances, 0, out=distances)
+
+    def distances(self, queries, gallery_rows=None):
+        # queries: (n, feature_size) histograms -> (n, gallery) distances.
+        # gallery_rows optionally restricts scoring to a subset of the gallery.
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if self.metric == "chisqr_alt":
+            return self._chisqr_alt(queries, gallery_rows)
+        distances = self._chisqr(queries)
+        return distances if gallery_rows is None else distances[:, gallery_rows]
+
+    def search(self, queries, k=1, gallery_rows=None):
+        # Top-k over gallery samples for a batch of query histograms.
+        # Returns (labels, distances), both (n, k), best match first.
+        distances = self.distances(queries, gallery_rows)
+        labels = self.labels if gallery_rows is None else self.labels[gallery_rows]
+        if distances.shape[1] == 0:
+            return (np.full((len(queries), k), -1, dtype=np.int32),
+                    np.full((len(queries), k), np.inf, dtype=np.float32))
+        k = min(k, distances.shape[1])
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        top_dist = np.take_along_axis(distances, top, axis=1)
+        order = np.argsort(top_dist, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return labels[top], np.take_along_axis(top_dist, order, axis=1)
+
+    def predict_batch(self, faces, k=1, gallery_rows=None):
+        if not faces:
+            return np.empty((0, k), dtype=np.int32), np.empty((0, k), dtype=np.float32)
+        return self.search(self.compute_histograms(faces), k, gallery_rows)
+
+    def predict(self, face):
+        # Same contract as LBPHFaceRecognizer.predict: (label, distance), -1 if no gallery
+        labels, distances = self.predict_batch([face])
+        return int(labels[0, 0]), float(distances[0, 0])
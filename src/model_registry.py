@@ -0,0 +1,168 @@
+import hashlib
+import os
+import threading
+import cv2
+import numpy as np
+
+from src.gallery_index import CentroidIndex
+from src.lbph import NumpyLBPH
+from src.model_store import header_path, is_binary_model, load_binary_model
+from src.model_versions import read_pointer
+
+
+class LoadedModel:
+    def __init__(self, path, engine, index, stat, digest):
+        self.path = path
+        self.engine = engine
+        self.index = index
+        self.stat = stat
+        self.digest = digest
+        self._allowed_rows = {}
+
+    def rows_for(self, allowed):
+        # Gallery rows belonging to a set of labels (e.g. a class roster), cached per set
+        key = frozenset(allowed)
+        rows = self._allowed_rows.get(key)
+        if rows is None:
+            rows = np.flatnonzero(np.isin(self.engine.labels, list(key)))
+            self._allowed_rows[key] = rows
+        return rows
+
+    def predict_batch(self, faces, k=1, allowed=None):
+        # allowed: optional set of labels to restrict matching to
+        if self.index is not None:
+            return self.index.predict_batch(self.engine, faces, k, allowed)
+        gallery_rows = self.rows_for(allowed) if allowed is not None else None
+        return self.engine.predict_batch(faces, k, gallery_rows)
+
+
+class SharedCascade:
+    # A CascadeClassifier shared between threads. detectMultiScale is not safe to run
+    # concurrently on one classifier, so calls are serialized; a classifier per thread
+    # would mean re-parsing the cascade XML for every short-lived session thread.
+    def __init__(self, path):
+        self.cascade = cv2.CascadeClassifier(path)
+        self._lock = threading.Lock()
+
+    def empty(self):
+        return self.cascade.empty()
+
+    def detectMultiScale(self, image, *args, **kwargs):
+        with self._lock:
+            return self.cascade.detectMultiScale(image, *args, **kwargs)
+
+
+def _file_stat(path):
+    if path is None or not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        # Binary models are directories; their header is written last
+        path = header_path(path)
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    # Process-wide cache of parsed models and cascades. model_path may be a trainer.yml
+    # or a binary model directory (see model_store). Parsing trainer.yml is the slow
+    # part of recognition start-up, so it happens once per model file version and the
+    # result is shared by every caller (GUI, Streamlit sessions, recognition loops).
+    # A model is re-read only when its (or its index's) mtime/size changes; with
+    # verify_hash the model's content hash must change too, so a touched-but-identical
+    # file does not trigger a reload. Published versions are immutable, following the
+    # pointer file (get_published) is enough to pick up a retrain.
+    def __init__(self, verify_hash=False):
+        self.verify_hash = verify_hash
+        self._lock = threading.Lock()
+        self._models = {}
+        self._cascades = {}
+        # model_dir -> cache key of the version its pointer named last time
+        self._published = {}
+
+    def get_cascade(self, path):
+        with self._lock:
+            cascade = self._cascades.get(path)
+            if cascade is None:
+                cascade = SharedCascade(path)
+                self._cascades[path] = cascade
+            return cascade
+
+    def get_model(self, model_path, index_path=None):
+        # Returns a LoadedModel, or None if the model file does not exist yet
+        if not os.path.exists(model_path):
+            return None
+        with self._lock:
+            key = os.path.abspath(model_path)
+            loaded = self._models.get(key)
+            # The index is written after the model, so it is part of the signature too
+            stat = (_file_stat(model_path), _file_stat(index_path))
+            if loaded is not None and loaded.stat == stat:
+                return loaded
+
+            digest = None
+            if self.verify_hash and not os.path.isdir(model_path):
+                digest = _file_digest(model_path)
+            if (loaded is not None and digest is not None and loaded.digest == digest
+                    and loaded.stat[1] == stat[1]):
+                loaded.stat = stat
+                return loaded
+
+            loaded = self._load(model_path, index_path, stat, digest)
+            self._models[key] = loaded
+            return loaded
+
+    def get_published(self, model_dir):
+        # LoadedModel of the version model_dir's pointer file names (see model_versions),
+        # or None before the first publish. Callers holding the previous version keep it
+        # until they ask again; the registry itself only keeps the live one.
+        pointer = read_pointer(model_dir)
+        if pointer is None:
+            return None
+        loaded = self.get_model(pointer["model"], pointer["index"])
+        with self._lock:
+            key = os.path.abspath(pointer["model"])
+            previous = self._published.get(model_dir)
+            if previous is not None and previous != key:
+                self._models.pop(previous, None)
+            self._published[model_dir] = key
+        return loaded
+
+    def _load(self, model_path, index_path, stat, digest):
+        if is_binary_model(model_path):
+            engine = load_binary_model(model_path)
+        else:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(model_path)
+            engine = NumpyLBPH.from_opencv(recognizer)
+
+        index = None
+        if index_path and os.path.exists(index_path):
+            try:
+                index = CentroidIndex.load(index_path)
+                if not index.matches(engine):
+                    index = None
+            except Exception as e:
+                print(f"Ignoring unreadable index {index_path}: {e}")
+        return LoadedModel(model_path, engine, index, stat, digest)
+
+    def invalidate(self, model_path=None):
+        with self._lock:
+            if model_path is None:
+                self._models.clear()
+            else:
+                self._models.pop(os.path.abspath(model_path), None)
+
+
+_default_registry = ModelRegistry()
+
+
+def get_registry():
+    return _default_registry
@@ -0,0 +1,190 @@
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import cv2
+import numpy as np
+
+from src.lbph import NumpyLBPH
+
+# Binary LBPH model: a directory holding
+#   histograms.npy  float32 (feature_size, samples), the layout NumpyLBPH scans
+#   labels.npy      int32 (samples,)
+#   header.json     LBPH parameters and sample count, written last
+# Both arrays are plain .npy so they can be opened with np.load(mmap_mode='r') and
+# shared through the page cache by every recognition worker on the machine.
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+HISTOGRAMS_FILE = "histograms.npy"
+LABELS_FILE = "labels.npy"
+
+
+def header_path(model_dir):
+    return os.path.join(model_dir, HEADER_FILE)
+
+
+def is_binary_model(path):
+    return os.path.isdir(path) and os.path.exists(header_path(path))
+
+
+def _replace_npy(path, array):
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def save_binary_model(engine, model_dir):
+    os.makedirs(model_dir, exist_ok=True)
+    _replace_npy(os.path.join(model_dir, HISTOGRAMS_FILE), np.ascontiguousarray(engine.histograms.T))
+    _replace_npy(os.path.join(model_dir, LABELS_FILE), engine.labels.astype(np.int32))
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "radius": engine.radius,
+        "neighbors": engine.neighbors,
+        "grid_x": engine.grid_x,
+        "grid_y": engine.grid_y,
+        "samples": int(len(engine.labels)),
+    }
+    tmp_path = header_path(model_dir) + ".tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(header, fh)
+    os.replace(tmp_path, header_path(model_dir))
+
+
+def load_binary_model(model_dir, mmap=True, metric="chisqr_alt"):
+    with open(header_path(model_dir)) as fh:
+        header = json.load(fh)
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model format version in {model_dir}: {header.get('format_version')}")
+
+    mmap_mode = 'r' if mmap else None
+    gallery_t = np.load(os.path.join(model_dir, HISTOGRAMS_FILE), mmap_mode=mmap_mode)
+    labels = np.load(os.path.join(model_dir, LABELS_FILE))
+
+    engine = NumpyLBPH(header["radius"], header["neighbors"], header["grid_x"], header["grid_y"], metric=metric)
+    if gallery_t.shape != (engine.feature_size, header["samples"]) or len(labels) != header["samples"]:
+        # A writer replaced the arrays but has not got to the header yet
+        raise ValueError(f"Model files in {model_dir} do not match their header")
+    engine.set_gallery_transposed(gallery_t, labels)
+    return engine
+
+
+def convert_yml(yml_path, model_dir):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(yml_path)
+    engine = NumpyLBPH.from_opencv(recognizer)
+    save_binary_model(engine, model_dir)
+    return engine
+
+
+def export_yml(engine, yml_path):
+    # Writes the model in OpenCV's LBPH YAML layout, readable by recognizer.read(), for
+    # tools that still load trainer.yml. Replaced atomically; the extension stays last
+    # because OpenCV picks the format from it.
+    root, ext = os.path.splitext(yml_path)
+    tmp_path = root + ".tmp" + ext
+    fs = cv2.FileStorage(tmp_path, cv2.FILE_STORAGE_WRITE)
+    fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+    fs.write("threshold", float(np.finfo(np.float64).max))
+    fs.write("radius", int(engine.radius))
+    fs.write("neighbors", int(engine.neighbors))
+    fs.write("grid_x", int(engine.grid_x))
+    fs.write("grid_y", int(engine.grid_y))
+    fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+    for histogram in engine.histograms:
+        fs.write("", np.asarray(histogram, dtype=np.float32).reshape(1, -1))
+    fs.endWriteStruct()
+    fs.write("labels", engine.labels.astype(np.int32).reshape(-1, 1))
+    fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+    os.replace(tmp_path, yml_path)
+
+
+def _rss_kb():
+    # Current resident set size (Linux only, 0 elsewhere). ru_maxrss is no use here:
+    # it is a peak and survives the fork+exec that starts the benchmark process.
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def _measure_load(path, results):
+    # Same work for both formats: load, then one prediction on a face-sized crop, which
+    # for the binary format also faults in the memory-mapped pages a first query touches
+    face = np.random.default_rng(0).integers(0, 256, (100, 100), dtype=np.uint8)
+    before = _rss_kb()
+    start = time.perf_counter()
+    if is_binary_model(path):
+        load_binary_model(path).predict(face)
+    else:
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(path)
+        recognizer.predict(face)
+    seconds = time.perf_counter() - start
+    results.put({"path": path, "seconds": seconds, "rss_kb": _rss_kb() - before})
+
+
+def _wait_result(proc, results, timeout):
+    # The child's report, or an error dict if it died (bad path, out of memory) or ran
+    # past timeout, instead of waiting forever on a report that never comes
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return results.get(timeout=0.5)
+        except queue.Empty:
+            pass
+        if not proc.is_alive():
+            try:
+                return results.get(timeout=0.5)
+            except queue.Empty:
+                return {"error": f"exited with code {proc.exitcode}"}
+        if time.monotonic() > deadline:
+            proc.terminate()
+            return {"error": f"no result after {timeout:.0f}s"}
+
+
+def benchmark_load(paths, timeout=300.0):
+    # Loads each model in a fresh process so RSS numbers are not polluted by each other.
+    # A failed load is reported as {"path", "error"} and the other paths still run.
+    ctx = multiprocessing.get_context("spawn")
+    reports = []
+    for path in paths:
+        results = ctx.Queue()
+        proc = ctx.Process(target=_measure_load, args=(path, results))
+        proc.start()
+        report = _wait_result(proc, results, timeout)
+        proc.join()
+        if "error" in report:
+            report["path"] = path
+            print(f"Benchmark of {path} failed: {report['error']}")
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    # python -m src.model_store convert data/models/trainer.yml data/models/trainer_lbph
+    # python -m src.model_store benchmark data/models/trainer.yml data/models/trainer_lbph
+    # python -m src.model_store export data/models/versions/<v>/trainer_lbph data/models/trainer.yml
+    if len(sys.argv) == 4 and sys.argv[1] == "convert":
+        engine = convert_yml(sys.argv[2], sys.argv[3])
+        print(f"Converted {len(engine.labels)} samples to {sys.argv[3]}")
+    elif len(sys.argv) == 4 and sys.argv[1] == "export":
+        engine = load_binary_model(sys.argv[2])
+        export_yml(engine, sys.argv[3])
+        print(f"Exported {len(engine.labels)} samples to {sys.argv[3]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "benchmark":
+        for report in benchmark_load(sys.argv[2:]):
+            if "error" in report:
+                continue
+            print(f"{report['path']}: {report['seconds']:.3f}s, +{report['rss_kb'] / 1024:.1f} MB RSS")
+    else:
+        print("usage: python -m src.model_store convert <trainer.yml> <model_dir>\n"
+              "       python -m src.model_store benchmark <model_path> [<model_path> ...]\n"
+              "       python -m src.model_store export <model_dir> <trainer.yml>")
@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import time
+
+from src.gallery_index import CentroidIndex
+from src.model_store import save_binary_model
+
+# Versioned recognition models:
+#   <model_dir>/versions/<version>/trainer_lbph/   binary LBPH model (see model_store)
+#   <model_dir>/versions/<version>/index.npz       centroid index
+#   <model_dir>/current.json                       pointer to the live version
+# A version is written under a temporary name, renamed into place once complete and
+# only then published by atomically replacing the pointer, so readers never see a
+# half-written model. Readers follow the pointer and swap when it changes.
+POINTER_FILE = "current.json"
+VERSIONS_DIR = "versions"
+
+
+def pointer_path(model_dir):
+    return os.path.join(model_dir, POINTER_FILE)
+
+
+def save_opencv_model(recognizer, path):
+    # trainer.yml is written by full rebuilds and export_opencv_model() for the legacy
+    # scripts (incremental training appends to the published binary model instead);
+    # replace it atomically too. OpenCV picks the format from the extension, keep it last.
+    root, ext = os.path.splitext(path)
+    tmp_path = root + ".tmp" + ext
+    recognizer.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _version_key(version):
+    # Versions are named v<sequence>-<UTC time>; names from older releases (local time,
+    # no sequence) sort before every numbered one
+    head = version.split("-", 1)[0]
+    if head.startswith("v") and head[1:].isdigit():
+        return 1, int(head[1:]), version
+    return 0, 0, version
+
+
+def list_versions(model_dir):
+    # Complete versions under model_dir, oldest first
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted((v for v in os.listdir(versions_dir) if not v.startswith(".")), key=_version_key)
+
+
+def _next_version(model_dir):
+    # The sequence number orders versions, whatever the wall clock does (DST, NTP steps,
+    # timezone changes); the UTC time is only there for people reading the directory
+    versions = list_versions(model_dir)
+    sequence = _version_key(versions[-1])[1] + 1 if versions else 1
+    seconds, nanoseconds = divmod(time.time_ns(), 1000000000)
+    return f"v{sequence:06d}-" + time.strftime("%Y%m%dT%H%M%S", time.gmtime(seconds)) + f".{nanoseconds:09d}Z"
+
+
+def read_pointer(model_dir):
+    # {"version", "model", "index"} with absolute paths, or None before the first publish
+    try:
+        with open(pointer_path(model_dir)) as fh:
+            pointer = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    version_dir = os.path.join(model_dir, VERSIONS_DIR, pointer["version"])
+    if not os.path.isdir(version_dir):
+        return None
+    pointer["model"] = os.path.join(version_dir, "trainer_lbph")
+    pointer["index"] = os.path.join(version_dir, "index.npz")
+    return pointer
+
+
+def publish_version(engine, model_dir, index_probes=8, keep=3, extra=None):
+    # Writes engine as a new version and makes it the live one; returns the version name.
+    # extra: additional fields stored in the pointer (returned by read_pointer)
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    version = _next_version(model_dir)
+    tmp_dir = os.path.join(versions_dir, ".tmp-" + version)
+    save_binary_model(engine, os.path.join(tmp_dir, "trainer_lbph"))
+    CentroidIndex.build(engine, index_probes).save(os.path.join(tmp_dir, "index.npz"))
+    os.rename(tmp_dir, os.path.join(versions_dir, version))
+
+    pointer = dict(extra or {})
+    pointer.update({"version": version, "published": time.time(), "samples": int(len(engine.labels))})
+    tmp_path = pointer_path(model_dir) + ".tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(pointer, fh)
+    os.replace(tmp_path, pointer_path(model_dir))
+
+    prune_versions(model_dir, keep)
+    return version
+
+
+def prune_versions(model_dir, keep=3):
+    # Drops all but the newest `keep` versions. Sessions still on an old version keep
+    # working: its arrays are already loaded or memory-mapped, and they swap on the
+    # next pointer check.
+    versions_dir = os.path.join(model_dir, VERSIONS_DIR)
+    pointer = read_pointer(model_dir)
+    versions = list_versions(model_dir)
+    for version in versions[:-keep] if keep else versions:
+        if pointer is None or version != pointer["version"]:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    # Cheap frame-differencing check in front of detection. Each frame is shrunk to a
+    # small grayscale thumbnail and compared with the previous one; when the scene is
+    # static the recognition loop skips detection/prediction and reuses its last results.
+    # Any motion re-opens the gate immediately, and it stays open for cooldown_frames so
+    # people settling into seats are still picked up. Every idle_interval skipped frames
+    # one frame is let through anyway, so slow changes (lighting) are never missed for long.
+    def __init__(self, thumb_size=(64, 48), pixel_threshold=15, motion_fraction=0.005,
+                 cooldown_frames=15, idle_interval=50):
+        self.thumb_size = thumb_size
+        self.pixel_threshold = pixel_threshold
+        # Fraction of thumbnail pixels that must change to count as motion
+        self.motion_fraction = motion_fraction
+        self.cooldown_frames = cooldown_frames
+        self.idle_interval = idle_interval
+        self._previous = None
+        self._open_for = 0
+        self._idle_frames = 0
+        self.passed = 0
+        self.skipped = 0
+
+    def _thumbnail(self, img):
+        # Shrink first, then convert: colour conversion on the thumbnail is nearly free
+        thumb = cv2.resize(img, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(thumb, (3, 3), 0)
+
+    def check(self, img):
+        # True when the frame should go through detection and recognition
+        thumb = self._thumbnail(img)
+        previous, self._previous = self._previous, thumb
+
+        moving = previous is None
+        if not moving:
+            changed = np.count_nonzero(cv2.absdiff(thumb, previous) > self.pixel_threshold)
+            moving = changed >= self.motion_fraction * thumb.size
+
+        if moving:
+            self._open_for = self.cooldown_frames
+        elif self._open_for > 0:
+            self._open_for -= 1
+        else:
+            self._idle_frames += 1
+            if self._idle_frames < self.idle_interval:
+                self.skipped += 1
+                return False
+
+        self._idle_frames = 0
+        self.passed += 1
+        return True
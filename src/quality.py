@@ -0,0 +1,107 @@
+import math
+import cv2
+import numpy as np
+
+
+def sharpness(crop):
+    # Variance of the Laplacian: low for blurred / motion-smeared crops
+    return float(cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def dhash(crop, hash_size=8):
+    # 64-bit difference hash; near-identical frames differ in only a few bits
+    small = cv2.resize(crop, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def yaw_offset(crop):
+    # Coarse head-turn estimate: horizontal centroid of edge energy relative to the crop
+    # centre, in [-0.5, 0.5]. Eyes, nose and mouth shift sideways inside the detector's
+    # box when the head turns, which moves the centroid; frontal faces sit near 0.
+    edges = np.abs(cv2.Sobel(crop, cv2.CV_32F, 1, 0, ksize=3)).sum(axis=0)
+    total = edges.sum()
+    if total <= 0:
+        return 0.0
+    centroid = float((edges * np.arange(len(edges))).sum() / total)
+    return centroid / max(1, len(edges) - 1) - 0.5
+
+
+class SampleQualityGate:
+    # Decides which detected crops are worth keeping during enrollment:
+    #  - blurry crops (Laplacian variance below min_sharpness) are rejected,
+    #  - near-duplicates of an accepted sample (dHash distance below min_hash_distance)
+    #    are rejected,
+    #  - samples are spread over pose_buckets head-turn buckets, each capped at an equal
+    #    share of max_samples, so a student who never moves cannot fill the gallery with
+    #    one pose.
+    # Capture is over when max_samples are accepted, or when nothing new was accepted
+    # for stall_frames frames while at least min_samples are in and at least
+    # min_pose_buckets poses are covered. max_frames ends it regardless, so a student who
+    # cannot get past the blur / pose checks does not keep the camera running forever.
+    def __init__(self, max_samples=30, min_samples=10, min_sharpness=60.0, min_hash_distance=6,
+                 pose_buckets=3, pose_range=0.06, stall_frames=150, min_pose_buckets=2,
+                 max_frames=1800):
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.min_sharpness = min_sharpness
+        self.min_hash_distance = min_hash_distance
+        self.pose_buckets = pose_buckets
+        # |yaw_offset| at which a crop lands in the outermost bucket
+        self.pose_range = pose_range
+        self.stall_frames = stall_frames
+        self.min_pose_buckets = min(min_pose_buckets, pose_buckets)
+        self.max_frames = max_frames
+        self.frames = 0
+        self._hashes = []
+        self._bucket_counts = [0] * pose_buckets
+        self._frames_since_accept = 0
+        self.rejected = {"blur": 0, "duplicate": 0, "pose": 0}
+
+    @property
+    def accepted(self):
+        return len(self._hashes)
+
+    def _bucket(self, crop):
+        if self.pose_buckets == 1:
+            return 0
+        position = (yaw_offset(crop) + self.pose_range) / (2 * self.pose_range)
+        return min(self.pose_buckets - 1, max(0, int(position * self.pose_buckets)))
+
+    def accept(self, crop):
+        # Returns (accepted, reason); reason is None when accepted
+        if sharpness(crop) < self.min_sharpness:
+            self.rejected["blur"] += 1
+            return False, "blur"
+
+        crop_hash = dhash(crop)
+        if any(hamming(crop_hash, h) < self.min_hash_distance for h in self._hashes):
+            self.rejected["duplicate"] += 1
+            return False, "duplicate"
+
+        bucket = self._bucket(crop)
+        if self._bucket_counts[bucket] >= math.ceil(self.max_samples / self.pose_buckets):
+            self.rejected["pose"] += 1
+            return False, "pose"
+
+        self._hashes.append(crop_hash)
+        self._bucket_counts[bucket] += 1
+        self._frames_since_accept = 0
+        return True, None
+
+    def end_frame(self):
+        self.frames += 1
+        self._frames_since_accept += 1
+
+    def poses_covered(self):
+        return sum(1 for count in self._bucket_counts if count)
+
+    def done(self):
+        if self.accepted >= self.max_samples or self.frames >= self.max_frames:
+            return True
+        return (self.accepted >= self.min_samples and self.poses_covered() >= self.min_pose_buckets
+                and self._frames_since_accept >= self.stall_frames)
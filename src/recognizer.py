@@ -1,28 +1,100 @@
 import cv2
 import os
+import sys
+import json
+import time
+import threading
 import numpy as np
-from PIL import Image
+
+from src.capture import FrameGrabber, is_live_source, open_source
+from src.detection import FaceDetector
+from src.condense import select_representatives
+from src.face_cache import FaceCache
+from src.ingest import ingest_training_images
+from src.lbph import NumpyLBPH
+from src.model_registry import get_registry
+from src.motion import MotionGate
+from src.model_store import export_yml, is_binary_model, load_binary_model
+from src.model_versions import publish_version, read_pointer, save_opencv_model
+from src.quality import SampleQualityGate
+from src.sample_writer import AsyncJpegWriter, ShardWriter, is_shard_file, load_shard
+from src.session import RecognitionSession
+from src.subject_models import ensure_subject_model
 
 class FaceRecognizer:
-    def __init__(self):
+    def __init__(self, train_workers=None):
         self.face_cascade_path = "resources/haarcascade_frontalface_default.xml"
         self.training_data_dir = "data/training_images"
+        # "jpeg": one file per sample in training_data_dir, "shard": one packed file per student
+        self.sample_storage = "jpeg"
+        self.shard_dir = "data/training_shards"
+        # Reject blurry, near-duplicate and same-pose crops while enrolling (see quality.py)
+        self.capture_quality_gate = True
         self.model_dir = "data/models"
         self.model_path = os.path.join(self.model_dir, "trainer.yml")
+        # Records which training files are already baked into the published model
+        self.manifest_path = os.path.join(self.model_dir, "trainer_manifest.json")
+        # Every train publishes a new version of the memory-mappable model and its
+        # identity-centroid index (see model_versions); recognition follows the pointer.
+        # index_path / binary_model_dir are where models trained before versioning live.
+        self.index_path = os.path.join(self.model_dir, "trainer_index.npz")
+        self.index_probes = 8
+        self.binary_model_dir = os.path.join(self.model_dir, "trainer_lbph")
+        # Seconds between checks for a newly published model during a session
+        self.model_check_interval = 1.0
+        # Per-subject shards of the model, cut from it for each subject's roster
+        self.subject_model_dir = os.path.join(self.model_dir, "subjects")
         
         # Ensure directories exist
         os.makedirs(self.training_data_dir, exist_ok=True)
         os.makedirs(self.model_dir, exist_ok=True)
+        self.face_cache = FaceCache(os.path.join(self.model_dir, "face_cache"))
+        # Processes used to decode/detect training images, None means one per core
+        self.train_workers = train_workers
+        self.last_ingest_stats = None
+        # Serialises train_model between the UI and the background TrainingWatcher
+        self._train_lock = threading.Lock()
+        # Cap on samples per student kept by full rebuilds (k-medoids, see src/condense.py).
+        # None keeps every sample; incremental updates always append as-is. Saved in the
+        # manifest by every train, so the cap set by `condense apply` sticks.
+        self.max_samples_per_identity = self._saved_sample_cap()
+        # Frames kept by the capture thread during recognition; older ones are dropped
+        self.frame_buffer_size = 2
+        # Detect every N frames and follow faces in between; confirmed faces are not re-predicted
+        self.tracking = True
+        self.detect_every = 5
+        # Webcam index, video file, stream URL or image directory; headless skips all windows
+        self.camera_source = 0
+        self.headless = False
+        self.last_session_stats = None
+        # Recognition-time detection: downscale factor, face size bounds in full-res
+        # pixels (see detection.face_size_range) and optional (x, y, w, h) region of interest
+        self.detection_scale = 1.0
+        self.min_face_size = None
+        self.max_face_size = None
+        self.detection_roi = None
+        # Skip detection/recognition while the scene is static (empty or unchanged room)
+        self.motion_gating = True
+        # With a roster, end the session once nobody new was confirmed for this long
+        self.plateau_seconds = 120
         
         self.face_cascade = cv2.CascadeClassifier(self.face_cascade_path)
         if self.face_cascade.empty():
             print(f"Error: Could not load cascade classifier from {self.face_cascade_path}")
             # Fallback to local if running from root without resources prefix
             if os.path.exists("haarcascade_frontalface_default.xml"):
-                 self.face_cascade = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
+                 self.face_cascade_path = "haarcascade_frontalface_default.xml"
+                 self.face_cascade = cv2.CascadeClassifier(self.face_cascade_path)
 
-    def capture_images(self, enrollment, name, callback=None):
-        cam = cv2.VideoCapture(0)
+    def capture_images(self, enrollment, name, callback=None, source=None, headless=None):
+        source = self.camera_source if source is None else source
+        headless = self.headless if headless is None else headless
+        if self.sample_storage == "shard":
+            writer = ShardWriter(self.shard_dir, name, enrollment)
+        else:
+            writer = AsyncJpegWriter(self.training_data_dir, name, enrollment)
+        cam = open_source(source)
+        gate = SampleQualityGate() if self.capture_quality_gate else None
         sample_num = 0
         
         while True:
@@ -34,89 +106,261 @@ class FaceRecognizer:
             faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
             
             for (x, y, w, h) in faces:
-                cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                crop = gray[y:y+h, x:x+w]
+                if gate is not None and not gate.accept(crop)[0]:
+                    continue
                 sample_num += 1
                 
-                # Save image
-                file_name = f"{name}.{enrollment}.{sample_num}.jpg"
-                cv2.imwrite(os.path.join(self.training_data_dir, file_name), gray[y:y+h, x:x+w])
+                # Save image (in the background, or packed into the student's shard)
+                writer.submit(crop, sample_num)
                 
-                cv2.imshow('Face Capture', img)
+                if not headless:
+                    cv2.rectangle(img, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                    cv2.imshow('Face Capture', img)
             
-            if cv2.waitKey(100) & 0xFF == ord('q'):
+            # The gate rejects repeated frames itself, so there is no need to pace capture
+            delay = 1 if gate is not None else 100
+            if not headless and cv2.waitKey(delay) & 0xFF == ord('q'):
                 break
+            elif gate is not None:
+                gate.end_frame()
+                if gate.done():
+                    break
             elif sample_num >= 60: # Stop after 60 samples
                 break
         
+        if gate is not None:
+            print(f"Captured {sample_num} samples over {gate.poses_covered()} poses, rejected {gate.rejected}")
         cam.release()
-        cv2.destroyAllWindows()
+        writer.close()
+        if not headless:
+            cv2.destroyAllWindows()
         return True
 
-    def train_model(self):
-        if not os.listdir(self.training_data_dir):
+    def _scan_training_files(self):
+        # filename -> [size, mtime_ns], used to spot new and rewritten samples.
+        # Packed shards are listed as "shards/<file>".
+        files = {}
+        for f in sorted(os.listdir(self.training_data_dir)):
+            st = os.stat(os.path.join(self.training_data_dir, f))
+            files[f] = [st.st_size, st.st_mtime_ns]
+        if os.path.isdir(self.shard_dir):
+            for f in sorted(os.listdir(self.shard_dir)):
+                if is_shard_file(f):
+                    st = os.stat(os.path.join(self.shard_dir, f))
+                    files["shards/" + f] = [st.st_size, st.st_mtime_ns]
+        return files
+
+    def scan_training_data(self):
+        # Snapshot of the training files, compared by TrainingWatcher to spot new samples
+        return self._scan_training_files()
+
+    def _load_manifest(self):
+        # The manifest describes the published model, incremental updates append to it
+        if not os.path.exists(self.manifest_path) or read_pointer(self.model_dir) is None:
+            return None
+        try:
+            with open(self.manifest_path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _saved_sample_cap(self):
+        try:
+            with open(self.manifest_path) as fh:
+                return json.load(fh).get("max_samples_per_identity")
+        except (OSError, ValueError):
+            return None
+
+    def _save_manifest(self, samples):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump({"samples": samples, "max_samples_per_identity": self.max_samples_per_identity}, fh)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _load_faces(self, filenames):
+        image_paths = [os.path.join(self.training_data_dir, f) for f in filenames if not f.startswith("shards/")]
+        face_samples, ids, self.last_ingest_stats = ingest_training_images(
+            image_paths, self.face_cascade_path, self.face_cache.cache_dir, self.train_workers)
+        print(f"Ingested training data: {self.last_ingest_stats}")
+
+        # Shards already hold normalized face crops, no decode or detection needed
+        for f in filenames:
+            if f.startswith("shards/"):
+                shard_faces, shard_ids = load_shard(os.path.join(self.shard_dir, f[len("shards/"):]))
+                face_samples.extend(shard_faces)
+                ids.extend(shard_ids)
+        return face_samples, ids
+
+    def load_training_data(self, filenames=None):
+        if filenames is None:
+            filenames = self._scan_training_files()
+        return self._load_faces(filenames)
+
+    def _condense(self, face_samples, ids):
+        # Keep only the max_samples_per_identity most representative samples per student
+        engine = NumpyLBPH()
+        engine.set_gallery(engine.compute_histograms(face_samples), np.array(ids))
+        keep = select_representatives(engine, self.max_samples_per_identity)
+        print(f"Condensed gallery from {len(ids)} to {len(keep)} samples.")
+        return [face_samples[i] for i in keep], [ids[i] for i in keep]
+
+    def _save_derived_models(self, recognizer):
+        publish_version(NumpyLBPH.from_opencv(recognizer), self.model_dir, self.index_probes)
+
+    def _recognition_paths(self):
+        # (model, index) recognition should use: the published version, else whatever an
+        # older install left behind
+        pointer = read_pointer(self.model_dir)
+        if pointer is not None:
+            return pointer["model"], pointer["index"]
+        if is_binary_model(self.binary_model_dir):
+            return self.binary_model_dir, self.index_path
+        return self.model_path, self.index_path
+
+    def train_model(self, incremental=True):
+        with self._train_lock:
+            return self._train_model(incremental)
+
+    def _train_model(self, incremental):
+        current = self._scan_training_files()
+        if not current:
             return False, "No training data found."
 
-        image_paths = [os.path.join(self.training_data_dir, f) for f in os.listdir(self.training_data_dir)]
-        face_samples = []
-        ids = []
+        manifest = self._load_manifest() if incremental else None
 
-        for image_path in image_paths:
-            try:
-                pil_image = Image.open(image_path).convert('L')
-                image_np = np.array(pil_image, 'uint8')
-                
-                # Expecting filename format: Name.Enrollment.SampleNum.jpg
-                filename = os.path.split(image_path)[-1]
-                parts = filename.split(".")
-                id = int(parts[1])
-                
-                faces = self.face_cascade.detectMultiScale(image_np)
-                for (x, y, w, h) in faces:
-                    face_samples.append(image_np[y:y+h, x:x+w])
-                    ids.append(id)
-            except Exception as e:
-                print(f"Skipping file {image_path}: {e}")
+        if manifest is not None:
+            known = manifest.get("samples", {})
+            # A removed or rewritten sample (student deleted or re-enrolled) cannot be
+            # taken back out of an LBPH model, so only pure additions go through update()
+            changed = [f for f, stat in known.items() if current.get(f) != stat]
+            if not changed:
+                new_files = [f for f in current if f not in known]
+                if not new_files:
+                    return True, "Model is already up to date."
+
+                face_samples, ids = self._load_faces(new_files)
+                if ids:
+                    # Append to the published binary model: no YAML parse or rewrite of
+                    # the whole gallery. trainer.yml is only refreshed by full rebuilds
+                    # and export_opencv_model().
+                    engine = load_binary_model(read_pointer(self.model_dir)["model"])
+                    engine.update(face_samples, np.array(ids))
+                    publish_version(engine, self.model_dir, self.index_probes)
+                self._save_manifest(current)
+                return True, f"Model updated with {len(ids)} new samples ({self.last_ingest_stats.images_per_second:.1f} img/s)."
+
+        face_samples, ids = self.load_training_data(current)
 
         if not ids:
              return False, "No valid faces found in training data."
 
+        if self.max_samples_per_identity:
+            face_samples, ids = self._condense(face_samples, ids)
+
         recognizer = cv2.face.LBPHFaceRecognizer_create()
         recognizer.train(face_samples, np.array(ids))
-        recognizer.save(self.model_path)
-        return True, "Model trained successfully."
+        save_opencv_model(recognizer, self.model_path)
+        self._save_derived_models(recognizer)
+        self._save_manifest(current)
+        return True, f"Model trained successfully ({self.last_ingest_stats.images_per_second:.1f} img/s)."
+
+    def export_opencv_model(self, path=None):
+        # Writes the published model as trainer.yml for scripts that still read OpenCV's
+        # format; incremental updates leave trainer.yml behind
+        pointer = read_pointer(self.model_dir)
+        if pointer is None:
+            return False, "Model not trained yet."
+        engine = load_binary_model(pointer["model"])
+        export_yml(engine, path or self.model_path)
+        return True, f"Exported {len(engine.labels)} samples to {path or self.model_path}."
+
+    def train_subject_models(self, rosters):
+        # rosters: subject -> enrolled students (DatabaseManager.get_rosters()). Shards are
+        # also cut on demand when a session starts, this just moves the work to training.
+        built = 0
+        for subject, roster in rosters.items():
+            if self._subject_model(subject, roster) is not None:
+                built += 1
+        return True, f"Subject models ready for {built} of {len(rosters)} subjects."
+
+    def _subject_model(self, subject, roster):
+        model_path, index_path = self._recognition_paths()
+        return ensure_subject_model(get_registry(), model_path, self.subject_model_dir,
+                                    subject, roster, index_path, self.index_probes)
 
-    def recognize_face(self):
-        if not os.path.exists(self.model_path):
+    def _session_model(self, subject=None, roster=None):
+        registry = get_registry()
+        shard = self._subject_model(subject, roster) if subject else None
+        if shard is not None:
+            return registry.get_published(shard)
+        return registry.get_published(self.model_dir) or registry.get_model(*self._recognition_paths())
+
+    def recognize_face(self, source=None, headless=None, max_frames=None, detailed=False, roster=None,
+                       subject=None):
+        # Returns the confirmed enrollment IDs, or with detailed=True one dict per student
+        # (votes, best_distance, mean_confidence, first_seen, last_seen).
+        # roster: enrollments expected in this class; matching is limited to them and the
+        # session ends by itself once all are confirmed or recognition has plateaued.
+        # subject: with a roster, recognition runs on that subject's model shard.
+        source = self.camera_source if source is None else source
+        headless = self.headless if headless is None else headless
+        if not os.path.exists(self._recognition_paths()[0]):
              return False, "Model not trained yet."
 
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(self.model_path)
+        # Shared, parsed-once model; scores every face in a frame in one batch call
+        model = self._session_model(subject, roster)
         
-        cam = cv2.VideoCapture(0)
+        cam = open_source(source)
+        # Live cameras get a capture thread that drops stale frames; recorded footage is
+        # read frame by frame so every frame is processed, as fast as possible
+        grabber = FrameGrabber(cam, self.frame_buffer_size).start() if is_live_source(source) else None
+        reader = grabber or cam
         font = cv2.FONT_HERSHEY_SIMPLEX
         
-        recognized_students = [] # List of tuples (enrollment, confidence)
+        detector = FaceDetector(self.face_cascade, self.detection_scale, 1.2, 5,
+                                self.min_face_size, self.max_face_size, self.detection_roi)
+        session = RecognitionSession(model, detector, tracking=self.tracking,
+                                     detect_every=self.detect_every, roster=roster,
+                                     plateau_seconds=self.plateau_seconds if roster else None)
+        gate = MotionGate() if self.motion_gating else None
+        start = time.perf_counter()
+        next_model_check = start + self.model_check_interval
+        model_swaps = 0
         
-        while True:
-            ret, img = cam.read()
+        while max_frames is None or session.frame_index < max_frames:
+            # Retraining publishes a new version; pick it up between frames
+            now = time.perf_counter()
+            if now >= next_model_check:
+                next_model_check = now + self.model_check_interval
+                latest = self._session_model(subject, roster)
+                if latest is not None and latest is not session.model:
+                    session.model = latest
+                    model_swaps += 1
+
+            ret, img = reader.read()
             if not ret:
                 break
                 
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.2, 5)
+            if gate is not None and not gate.check(img):
+                faces = session.skip_frame()
+            else:
+                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+                faces = session.process_frame(gray)
+            if session.should_stop():
+                break
+            if headless:
+                continue
             
-            for (x, y, w, h) in faces:
-                id, conf = recognizer.predict(gray[y:y+h, x:x+w])
+            for face in faces:
+                x, y, w, h = face.box
                 
                 # Check confidence (lower is better for LBPH)
-                if conf < 100:
-                    name = str(id) # Ideally we should fetch name from DB using this ID, doing it in caller
-                    confidence = "  {0}%".format(round(100 - conf))
+                if face.label is not None:
+                    confidence = "  {0}%".format(round(100 - face.distance))
                     
                     # We return the ID, caller will handle name lookup
-                    recognized_students.append(str(id))
-                    
-                    cv2.putText(img, str(id), (x+5, y-5), font, 1, (255, 255, 255), 2)
+                    cv2.putText(img, str(face.label), (x+5, y-5), font, 1, (255, 255, 255), 2)
                     cv2.putText(img, str(confidence), (x+5, y+h-5), font, 1, (255, 255, 0), 1)
                 else:
                     name = "unknown"
@@ -130,6 +374,36 @@ class FaceRecognizer:
             if k == 27: # Press 'ESC' to exit
                 break
         
-        cam.release()
-        cv2.destroyAllWindows()
-        return list(set(recognized_students)) # Return unique IDs found
+        elapsed = time.perf_counter() - start
+        self.last_session_stats = {
+            "frames": session.frame_index,
+            "seconds": elapsed,
+            "fps": session.frame_index / elapsed if elapsed > 0 else 0.0,
+            "detections": session.detections,
+            "predictions": session.predictions,
+            "skipped": session.skipped,
+            "model_swaps": model_swaps,
+        }
+        if grabber is not None:
+            # The grabber releases the camera once its thread is done reading
+            grabber.stop()
+            self.last_session_stats.update(grabber.stats())
+        else:
+            cam.release()
+        print(f"Recognition session: {self.last_session_stats}")
+        if not headless:
+            cv2.destroyAllWindows()
+        if detailed:
+            return session.results()
+        return sorted(session.recognized) # Return unique IDs found
+
+
+if __name__ == "__main__":
+    # Headless throughput run, e.g. on recorded classroom footage:
+    # python -m src.recognizer path/to/lecture.mp4 [max_frames]
+    if len(sys.argv) < 2:
+        print("usage: python -m src.recognizer <camera index | video | url | image dir> [max_frames]")
+        sys.exit(1)
+    recognizer = FaceRecognizer()
+    max_frames = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(recognizer.recognize_face(sys.argv[1], headless=True, max_frames=max_frames))
@@ -0,0 +1,87 @@
+import os
+import queue
+import threading
+import cv2
+import numpy as np
+
+SHARD_EXTENSION = ".npz"
+
+
+class AsyncJpegWriter:
+    # Hands cv2.imwrite off to a background thread so the capture loop never waits on
+    # disk. close() blocks until every queued sample is on disk.
+    def __init__(self, directory, name, enrollment, max_pending=256):
+        self.directory = directory
+        self.name = name
+        self.enrollment = enrollment
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="SampleWriter", daemon=True)
+        self._thread.start()
+        self.written = 0
+        self.failed = 0
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, crop = item
+            if cv2.imwrite(path, crop):
+                self.written += 1
+            else:
+                self.failed += 1
+                print(f"Could not write sample {path}")
+
+    def submit(self, crop, sample_num):
+        file_name = f"{self.name}.{self.enrollment}.{sample_num}.jpg"
+        # The crop is a view into the frame buffer, copy it before the next frame lands
+        self._queue.put((os.path.join(self.directory, file_name), crop.copy()))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class ShardWriter:
+    # Packs one capture session's crops into a single file per student,
+    # <shard_dir>/<Name>.<Enrollment>.npz, holding `faces` (N, size, size) uint8 crops
+    # resized to a fixed size and their `labels`. Training then reads one file per
+    # student instead of dozens of small JPEGs. A new capture replaces the shard, the
+    # same way re-enrolling overwrites Name.Enrollment.1..60.jpg.
+    def __init__(self, shard_dir, name, enrollment, sample_size=100):
+        self.shard_dir = shard_dir
+        self.name = name
+        self.enrollment = enrollment
+        # Model labels are ints, fail before capturing rather than when saving
+        self.label = int(enrollment)
+        self.sample_size = sample_size
+        self._faces = []
+        os.makedirs(self.shard_dir, exist_ok=True)
+
+    @property
+    def path(self):
+        return os.path.join(self.shard_dir, f"{self.name}.{self.enrollment}{SHARD_EXTENSION}")
+
+    def submit(self, crop, sample_num):
+        size = (self.sample_size, self.sample_size)
+        self._faces.append(cv2.resize(crop, size, interpolation=cv2.INTER_AREA))
+
+    def close(self):
+        if not self._faces:
+            return
+        faces = np.stack(self._faces).astype(np.uint8)
+        labels = np.full(len(faces), self.label, dtype=np.int32)
+        tmp_path = self.path + ".tmp" + SHARD_EXTENSION
+        np.savez(tmp_path, faces=faces, labels=labels)
+        os.replace(tmp_path, self.path)
+
+
+def is_shard_file(filename):
+    return filename.endswith(SHARD_EXTENSION) and ".tmp" not in filename
+
+
+def load_shard(path):
+    with np.load(path) as data:
+        faces = data["faces"]
+        labels = data["labels"]
+    return list(faces), [int(label) for label in labels]
@@ -0,0 +1,131 @@
+import time
+
+from src.tracking import FaceTracker
+from src.voting import IdentityAccumulator
+
+
+class FaceResult:
+    def __init__(self, box, label, distance, confirmed=False):
+        self.box = box
+        self.label = label
+        self.distance = distance
+        self.confirmed = confirmed
+
+
+class RecognitionSession:
+    # Per-frame recognition logic of FaceRecognizer.recognize_face, without any camera or
+    # window handling. With tracking enabled, detection runs every detect_every frames,
+    # faces are followed in between, and each track is only predicted until its identity
+    # is confirmed; without it every face in every frame is detected and predicted.
+    # Either way an identity is only reported once confirm_hits consecutive frames agree.
+    #
+    # With a roster (enrollments expected in the class) matching is restricted to those
+    # students, and should_stop() ends the session once all of them are confirmed or no
+    # new student has been confirmed for plateau_seconds.
+    def __init__(self, model, detector, threshold=100, tracking=True, detect_every=5, confirm_hits=3,
+                 roster=None, plateau_seconds=None):
+        self.model = model
+        # FaceDetector (or anything with detect(gray) -> [(x, y, w, h)])
+        self.detector = detector
+        self.threshold = threshold
+        self.detect_every = detect_every
+        self.tracker = FaceTracker(confirm_hits, threshold) if tracking else None
+        self.frame_index = 0
+        self.detections = 0
+        self.predictions = 0
+        self.skipped = 0
+        self.processed = 0
+        self.votes = IdentityAccumulator(confirm_hits, threshold)
+        self.last_results = []
+        self.roster = {str(e) for e in roster} if roster else None
+        # Model labels are ints; enrollments that are not numbers cannot be in the model
+        self._allowed = {int(e) for e in self.roster if e.isdigit()} if self.roster else None
+        self.plateau_seconds = plateau_seconds
+        self.started_at = time.time()
+        self.last_confirmed_at = None
+
+    @property
+    def recognized(self):
+        return {str(stats.label) for stats in self.votes.confirmed()}
+
+    def results(self):
+        # One dict per confirmed student: votes, best distance, mean confidence, first/last seen
+        return self.votes.results()
+
+    def detect(self, gray):
+        self.detections += 1
+        return [tuple(int(v) for v in face) for face in self.detector.detect(gray)]
+
+    def predict(self, gray, boxes):
+        self.predictions += len(boxes)
+        labels, distances = self.model.predict_batch([gray[y:y+h, x:x+w] for (x, y, w, h) in boxes],
+                                                     allowed=self._allowed)
+        return [(int(label), float(distance)) for label, distance in zip(labels[:, 0], distances[:, 0])]
+
+    def _vote(self, label, distance, now):
+        if self.votes.add(label, distance, self.processed, now):
+            self.last_confirmed_at = now
+
+    def missing(self):
+        # Rostered students not confirmed yet, None without a roster
+        if self.roster is None:
+            return None
+        return self.roster - self.recognized
+
+    def should_stop(self, now=None):
+        now = time.time() if now is None else now
+        if self.roster is not None and not self.missing():
+            return True
+        if self.plateau_seconds is not None:
+            # Counted from the start while nobody is confirmed, so an empty room (or a
+            # roster the model does not know) still ends the session
+            return now - (self.last_confirmed_at or self.started_at) >= self.plateau_seconds
+        return False
+
+    def skip_frame(self):
+        # Frame judged unchanged (see motion.MotionGate): nothing is run, last results stand
+        self.frame_index += 1
+        self.skipped += 1
+        return self.last_results
+
+    def process_frame(self, gray):
+        # Returns a FaceResult per visible face; label is None for unknown faces
+        self.frame_index += 1
+        self.processed += 1
+        if self.tracker is None:
+            self.last_results = self._process_untracked(gray)
+        else:
+            self.last_results = self._process_tracked(gray)
+        return self.last_results
+
+    def _process_tracked(self, gray):
+        if (self.processed - 1) % self.detect_every == 0 or not self.tracker.tracks:
+            self.tracker.update_detections(gray, self.detect(gray))
+        else:
+            self.tracker.track(gray)
+
+        now = time.time()
+        pending = self.tracker.pending()
+        for track, (label, distance) in zip(pending, self.predict(gray, [t.box for t in pending])):
+            self.tracker.record_prediction(track, label, distance)
+            self._vote(label, distance, now)
+
+        results = []
+        for track in self.tracker.tracks:
+            if track.confirmed and track not in pending:
+                self.votes.seen(track.label, now)
+            known = track.label is not None and track.hits > 0
+            results.append(FaceResult(track.box, track.label if known else None, track.distance, track.confirmed))
+        return results
+
+    def _process_untracked(self, gray):
+        now = time.time()
+        boxes = self.detect(gray)
+        results = []
+        for box, (label, distance) in zip(boxes, self.predict(gray, boxes)):
+            if distance < self.threshold:
+                self._vote(label, distance, now)
+                results.append(FaceResult(box, label, distance, self.votes.identities[label].confirmed))
+            else:
+                results.append(FaceResult(box, None, distance))
+        return results
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import re
+import threading
+import numpy as np
+
+from src.lbph import NumpyLBPH
+from src.model_store import header_path
+from src.model_versions import publish_version, read_pointer
+
+# Per-subject model shards, cut out of the global model for the students enrolled in
+# each subject (subject_enrollments table). Each subject directory is laid out like
+# data/models (see model_versions): immutable versions/<v>/ holding the binary model and
+# its index, and a current.json pointer that also records the roster and the global
+# model version the shard was cut from. A rebuild publishes a new version, so readers
+# never see a half-written shard. A shard is rebuilt whenever the roster or the global
+# model changes. Cutting a shard only copies histogram rows, no training images are
+# read again.
+_build_lock = threading.Lock()
+
+
+def subject_model_dir(base_dir, subject):
+    # Readable name plus a hash, so "CS 101" and "CS-101" do not share a directory
+    safe = re.sub(r"[^A-Za-z0-9_-]+", "_", subject).strip("_")[:40] or "subject"
+    digest = hashlib.sha1(subject.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(base_dir, f"{safe}-{digest}")
+
+
+def model_signature(model_path):
+    # Version of the global model a shard was cut from
+    if os.path.isdir(model_path):
+        model_path = header_path(model_path)
+    st = os.stat(model_path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def roster_labels(roster):
+    return sorted({int(e) for e in roster if str(e).isdigit()})
+
+
+def is_current(model_dir, roster, source):
+    pointer = read_pointer(model_dir)
+    return (pointer is not None and pointer.get("roster") == roster_labels(roster)
+            and pointer.get("source") == source)
+
+
+def build_subject_model(engine, subject, roster, model_dir, source, index_probes=8):
+    # Returns the number of samples in the shard; 0 means no enrolled student is in the
+    # model yet and nothing was written
+    labels = roster_labels(roster)
+    rows = np.flatnonzero(np.isin(engine.labels, labels))
+    if not len(rows):
+        return 0
+
+    shard = NumpyLBPH(engine.radius, engine.neighbors, engine.grid_x, engine.grid_y, metric=engine.metric)
+    shard.set_gallery(engine.histograms[rows], engine.labels[rows])
+    publish_version(shard, model_dir, index_probes, keep=2,
+                    extra={"subject": subject, "roster": labels, "source": source})
+    return len(rows)
+
+
+def ensure_subject_model(registry, model_path, base_dir, subject, roster, index_path=None, index_probes=8):
+    # Directory of an up-to-date shard for subject (load it with registry.get_published),
+    # building it from the global model when missing or stale; None when the global
+    # model should be used
+    if not subject or not roster or not os.path.exists(model_path):
+        return None
+    model_dir = subject_model_dir(base_dir, subject)
+    source = model_signature(model_path)
+    with _build_lock:
+        if not is_current(model_dir, roster, source):
+            model = registry.get_model(model_path, index_path)
+            if model is None or not build_subject_model(model.engine, subject, roster, model_dir,
+                                                        source, index_probes):
+                return None
+    return model_dir
@@ -0,0 +1,122 @@
+import itertools
+import cv2
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    _ids = itertools.count(1)
+
+    def __init__(self, box, template):
+        self.track_id = next(Track._ids)
+        self.box = tuple(int(v) for v in box)
+        self.template = template
+        self.label = None
+        self.distance = None
+        # Consecutive predictions agreeing on self.label
+        self.hits = 0
+        self.predictions = 0
+        self.confirmed = False
+        self.misses = 0
+
+
+class FaceTracker:
+    # Follows detected faces between detection frames with normalized template matching
+    # on the grayscale frame, so the (expensive) Haar detector only runs every few frames
+    # and each face is identified once instead of on every frame it appears in.
+    def __init__(self, confirm_hits=3, threshold=100, match_score=0.6, search_margin=0.5,
+                 min_iou=0.3, max_misses=2):
+        # Agreeing predictions below threshold needed before a track stops being predicted
+        self.confirm_hits = confirm_hits
+        self.threshold = threshold
+        # Minimum TM_CCOEFF_NORMED score for a template match to count as the same face
+        self.match_score = match_score
+        # Search window around the last box, as a fraction of the box size
+        self.search_margin = search_margin
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.tracks = []
+
+    def _crop(self, gray, box):
+        x, y, w, h = box
+        return gray[y:y+h, x:x+w].copy()
+
+    def update_detections(self, gray, boxes):
+        # Associate fresh detections with existing tracks (greedy, by IoU); unmatched
+        # detections start new tracks, tracks without a detection age out.
+        pairs = sorted(((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks)
+                        for bi, b in enumerate(boxes)), reverse=True)
+        matched_tracks = set()
+        matched_boxes = set()
+        for overlap, ti, bi in pairs:
+            if overlap < self.min_iou:
+                break
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            track = self.tracks[ti]
+            track.box = tuple(int(v) for v in boxes[bi])
+            track.template = self._crop(gray, track.box)
+            track.misses = 0
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+            if track.misses <= self.max_misses:
+                survivors.append(track)
+        for bi, box in enumerate(boxes):
+            if bi not in matched_boxes:
+                survivors.append(Track(box, self._crop(gray, tuple(int(v) for v in box))))
+        self.tracks = survivors
+
+    def track(self, gray):
+        # Move every track to the best template match near its previous position
+        rows, cols = gray.shape[:2]
+        survivors = []
+        for track in self.tracks:
+            x, y, w, h = track.box
+            mx, my = int(w * self.search_margin), int(h * self.search_margin)
+            x0, y0 = max(0, x - mx), max(0, y - my)
+            x1, y1 = min(cols, x + w + mx), min(rows, y + h + my)
+            window = gray[y0:y1, x0:x1]
+            th, tw = track.template.shape[:2]
+            if window.shape[0] < th or window.shape[1] < tw:
+                track.misses += 1
+            else:
+                scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+                _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+                if best >= self.match_score:
+                    track.box = (x0 + bx, y0 + by, w, h)
+                else:
+                    track.misses += 1
+            if track.misses <= self.max_misses:
+                survivors.append(track)
+        self.tracks = survivors
+
+    def pending(self):
+        return [t for t in self.tracks if not t.confirmed]
+
+    def record_prediction(self, track, label, distance):
+        track.predictions += 1
+        if distance >= self.threshold:
+            track.hits = 0
+            return
+        if label == track.label:
+            track.hits += 1
+            track.distance = min(track.distance, distance)
+        else:
+            track.label = int(label)
+            track.distance = distance
+            track.hits = 1
+        if track.hits >= self.confirm_hits:
+            track.confirmed = True
@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class TrainingWatcher:
+    # Background service that keeps the model in step with the training data. It polls
+    # the recognizer's training directories (a listdir + stat per file, no new
+    # dependency), waits until they have been quiet for `debounce` seconds so a capture
+    # burst becomes one update, then runs an incremental train_model() on its own
+    # thread. train_model publishes a new model version, which running sessions and the
+    # registry pick up by themselves. rosters: optional callable returning
+    # DatabaseManager.get_rosters(), to refresh per-subject shards after each update.
+    def __init__(self, recognizer, interval=1.0, debounce=3.0, rosters=None):
+        self.recognizer = recognizer
+        self.interval = interval
+        self.debounce = debounce
+        self.rosters = rosters
+        self._stop = None
+        self._thread = None
+        self.updates = 0
+        self.last_result = None
+        self.last_update = None
+        self.last_error = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self):
+        if not self.running:
+            # Each thread gets its own stop event: a thread told to stop may still be
+            # finishing a training run when a new one starts
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name="TrainingWatcher",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        # Returns at once, never waiting on a training run in progress; that run still
+        # completes and publishes, and the thread exits after it
+        if self._stop is not None:
+            self._stop.set()
+
+    def _run(self, stop):
+        # What is on disk when the watcher starts counts as handled; only changes from
+        # here on trigger training
+        trained = snapshot = self.recognizer.scan_training_data()
+        changed_at = None
+        while not stop.is_set():
+            current = self.recognizer.scan_training_data()
+            if current != snapshot:
+                snapshot = current
+                changed_at = time.monotonic()
+            elif (current != trained and changed_at is not None
+                  and time.monotonic() - changed_at >= self.debounce):
+                self._update()
+                # Samples written while training ran show up as a change on the next poll
+                trained = current
+            stop.wait(self.interval)
+
+    def _update(self):
+        try:
+            success, msg = self.recognizer.train_model(incremental=True)
+            if success and self.rosters is not None:
+                self.recognizer.train_subject_models(self.rosters())
+        except Exception as e:
+            success, msg = False, str(e)
+            self.last_error = msg
+        print(f"Background training: {msg}")
+        if success:
+            self.updates += 1
+        self.last_result = (success, msg)
+        self.last_update = time.time()
@@ -0,0 +1,79 @@
+import datetime
+
+
+class IdentityStats:
+    def __init__(self, label, timestamp):
+        self.label = label
+        self.votes = 0
+        # Consecutive processed frames this identity was predicted in
+        self.streak = 0
+        self.last_frame = None
+        self.best_distance = float("inf")
+        self.distance_sum = 0.0
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.confirmed = False
+
+    @property
+    def mean_distance(self):
+        return self.distance_sum / self.votes if self.votes else float("inf")
+
+    def as_dict(self):
+        return {
+            "enrollment": str(self.label),
+            "votes": self.votes,
+            "best_distance": self.best_distance,
+            # Same "confidence" the recognition window shows: 100 - LBPH distance
+            "mean_confidence": 100 - self.mean_distance,
+            "first_seen": datetime.datetime.fromtimestamp(self.first_seen).strftime('%H:%M:%S'),
+            "last_seen": datetime.datetime.fromtimestamp(self.last_seen).strftime('%H:%M:%S'),
+        }
+
+
+class IdentityAccumulator:
+    # Running per-identity vote counts for a recognition session, O(identities) memory
+    # no matter how long the session runs. An identity only counts as present once it
+    # was predicted (below threshold) in min_votes consecutive processed frames, so a
+    # single noisy frame can no longer mark a student present.
+    def __init__(self, min_votes=3, threshold=100, max_gap=1):
+        self.min_votes = min_votes
+        self.threshold = threshold
+        # Processed frames that may pass between two votes without breaking a streak
+        self.max_gap = max_gap
+        self.identities = {}
+
+    def add(self, label, distance, frame_index, timestamp):
+        # Returns True when this vote confirmed the identity
+        if distance >= self.threshold:
+            return False
+        stats = self.identities.get(label)
+        if stats is None:
+            stats = self.identities[label] = IdentityStats(label, timestamp)
+
+        if stats.last_frame is not None and frame_index - stats.last_frame <= self.max_gap:
+            if frame_index != stats.last_frame:
+                stats.streak += 1
+        else:
+            stats.streak = 1
+        stats.last_frame = frame_index
+        stats.votes += 1
+        stats.distance_sum += distance
+        stats.best_distance = min(stats.best_distance, distance)
+        stats.last_seen = timestamp
+
+        if not stats.confirmed and stats.streak >= self.min_votes:
+            stats.confirmed = True
+            return True
+        return False
+
+    def seen(self, label, timestamp):
+        # Confirmed identity still in view (e.g. followed by the tracker without predicting)
+        stats = self.identities.get(label)
+        if stats is not None:
+            stats.last_seen = timestamp
+
+    def confirmed(self):
+        return sorted((s for s in self.identities.values() if s.confirmed), key=lambda s: s.first_seen)
+
+    def results(self):
+        return [stats.as_dict() for stats in self.confirmed()]
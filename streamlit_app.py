@@ -9,10 +9,19 @@ import pandas as pd # Added for charts
 
 # Local Modules
 from src.database import DatabaseManager
+from src.model_registry import get_registry
 from src.styles import apply_glass_style
+from src.recognizer import FaceRecognizer
+from src.train_watcher import TrainingWatcher
 
-# Initialize standard database
-db = DatabaseManager()
+# Initialize standard database, once per server process: the script reruns on every
+# interaction, and every rerun runs on a new thread; the manager's connection pool is
+# shared by all of them
+@st.cache_resource
+def get_database():
+    return DatabaseManager()
+
+db = get_database()
 
 # --- Page Config ---
 st.set_page_config(page_title="Attendance System", layout="wide", page_icon="🟣")
@@ -20,6 +29,17 @@ st.set_page_config(page_title="Attendance System", layout="wide", page_icon="
 # --- Apply Custom CSS ---
 apply_glass_style()
 
+# One trainer per server process: the "Start Training" button and the background
+# watcher share it, so its training lock keeps them from overlapping
+@st.cache_resource
+def get_recognizer():
+    return FaceRecognizer()
+
+# Background trainer, one per server process; started from the Train Model page
+@st.cache_resource
+def get_training_watcher():
+    return TrainingWatcher(get_recognizer(), rosters=db.get_rosters)
+
 # --- Helper Functions for Streamlit ---
 def save_uploaded_image(uploaded_file, name, enrollment):
     # Ensure directory exists
@@ -42,53 +62,15 @@ def save_uploaded_image(uploaded_file, name, enrollment):
     except Exception as e:
         return False, str(e)
 
-def train_model():
-    training_dir = "data/training_images"
-    model_dir = "data/models"
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, "trainer.yml")
-    
-    if not os.path.exists(training_dir) or not os.listdir(training_dir):
-        return False, "No training data found."
-
-    image_paths = [os.path.join(training_dir, f) for f in os.listdir(training_dir)]
-    face_samples = []
-    ids = []
-    
-    detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-
-    for image_path in image_paths:
-        try:
-            pil_image = Image.open(image_path).convert('L')
-            image_np = np.array(pil_image, 'uint8')
-            
-            filename = os.path.split(image_path)[-1]
-            parts = filename.split(".")
-            id_val = int(parts[1])
-            
-            faces = detector.detectMultiScale(image_np)
-            for (x, y, w, h) in faces:
-                face_samples.append(image_np[y:y+h, x:x+w])
-                ids.append(id_val)
-        except Exception:
-            pass
-
-    if not ids:
-        return False, "No valid faces found."
-
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.train(face_samples, np.array(ids))
-    recognizer.save(model_path)
-    return True, "Model trained successfully."
-
-def recognize_from_image(uploaded_file):
-    model_path = "data/models/trainer.yml"
-    if not os.path.exists(model_path):
+def recognize_from_image(uploaded_file, roster=None, subject=None):
+    # Same model resolution as live sessions (subject shard, published version, legacy
+    # files), through the process-wide registry, so the model and cascade are parsed
+    # once and only reloaded after a retrain publishes a new version
+    model = get_recognizer()._session_model(subject, roster)
+    if model is None:
         return False, "Model not trained."
     
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(model_path)
-    detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    detector = get_registry().get_cascade(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
     
     image = Image.open(uploaded_file).convert('L')
     image_np = np.array(image, 'uint8')
@@ -96,8 +78,10 @@ def recognize_from_image(uploaded_file):
     
     recognized_ids = []
     
-    for (x, y, w, h) in faces:
-        id_val, conf = recognizer.predict(image_np[y:y+h, x:x+w])
+    # Only match against students enrolled in the subject, when a roster exists
+    allowed = {int(e) for e in roster if str(e).isdigit()} if roster else None
+    labels, distances = model.predict_batch([image_np[y:y+h, x:x+w] for (x, y, w, h) in faces], allowed=allowed)
+    for id_val, conf in zip(labels[:, 0], distances[:, 0]):
         if conf < 100:
             recognized_ids.append(str(id_val))
             
@@ -120,28 +104,40 @@ if page == "Dashboard":
     students_rows = db.get_student_details()
     total_students = len(students_rows) if students_rows else 0
     
-    # Mock daily attendance (since we don't have a 'get_today_attendance' method yet)
-    # We can get total calls to log?
-    # For now, let's just show total students
+    # Read from the summary tables, not the raw attendance log
+    today = datetime.date.today().strftime('%Y-%m-%d')
+    present_today = sum(row[2] for row in db.get_daily_counts(start_date=today, end_date=today))
     
     col1, col2, col3 = st.columns(3)
     col1.metric("Total Students", total_students, delta="Active")
-    col2.metric("System Status", "Online", delta="Stable")
+    col2.metric("Present Today", present_today)
     col3.metric("Last Update", datetime.datetime.now().strftime("%H:%M"), delta="Live")
     
     # Charts Section
     st.markdown("### Attendance Analytics")
-    if total_students > 0:
-        # Mock data for visualization if no logs
-        # Or try to fetch some logs if possible
-        # logs = db.get_attendance_log("Maths") # Example
-        
-        # Let's show a mock chart for aesthetic demonstration as requested
-        chart_data = pd.DataFrame(
-            np.random.randn(20, 3),
-            columns=['a', 'b', 'c'])
-        
-        st.bar_chart(chart_data)
+    subjects = db.get_subjects()
+    if subjects:
+        since = (datetime.date.today() - datetime.timedelta(days=30)).strftime('%Y-%m-%d')
+        daily = pd.DataFrame(db.get_daily_counts(start_date=since), columns=["Date", "Subject", "Present"])
+        if not daily.empty:
+            st.markdown("#### Daily attendance per subject (last 30 days)")
+            st.bar_chart(daily.pivot(index="Date", columns="Subject", values="Present").fillna(0))
+
+        trend_subject = st.selectbox("Subject", ["All subjects"] + subjects)
+        subject = None if trend_subject == "All subjects" else trend_subject
+        trend = pd.DataFrame(db.get_attendance_trend(subject, days=60),
+                             columns=["Date", "Present", "7-session average"])
+        if not trend.empty:
+            st.markdown("#### Trend")
+            st.line_chart(trend.set_index("Date"))
+
+        if subject is not None:
+            st.markdown("#### Attendance per student")
+            per_student = pd.DataFrame(db.get_student_attendance(subject),
+                                       columns=["Enrollment", "Name", "Attended", "Sessions", "Attendance %"])
+            st.dataframe(per_student, use_container_width=True)
+    elif total_students > 0:
+        st.info("Mark attendance to see analytics.")
     else:
         st.info("Register students to see analytics.")
 
@@ -160,6 +156,7 @@ elif page == "Register Student":
             st.markdown("#### 📝 Details")
             enrollment = st.text_input("Enrollment ID", placeholder="Ex: 101")
             name = st.text_input("Student Name", placeholder="Ex: John Doe")
+            subjects = st.text_input("Subjects (comma separated)", placeholder="Ex: Mathematics, Physics")
             
             if st.button("Save Profile"):
                 if enrollment and name and img_file:
@@ -167,6 +164,9 @@ elif page == "Register Student":
                         # 1. Register in DB
                         success, msg = db.add_student(enrollment, name)
                         if success or "already exists" in msg:
+                            subject_list = [subj.strip() for subj in subjects.split(",") if subj.strip()]
+                            if subject_list:
+                                db.enroll_in_subjects(enrollment, subject_list)
                             # 2. Save Image
                             ok, img_msg = save_uploaded_image(img_file, name, enrollment)
                             if ok:
@@ -187,12 +187,25 @@ elif page == "Train Model":
     with col1:
         if st.button("Start Training"):
             with st.spinner("Training Neural Network..."):
-                success, msg = train_model()
+                # Incremental: only new or changed images are read, the recognizer falls
+                # back to a full rebuild when the manifest does not match
+                success, msg = get_recognizer().train_model()
                 if success:
                     st.success(msg)
                     st.balloons()
                 else:
                     st.error(msg)
+    with col2:
+        watcher = get_training_watcher()
+        auto_train = st.checkbox("Keep the model up to date automatically", value=watcher.running,
+                                 help="Watches data/training_images and updates the model in the background.")
+        if auto_train and not watcher.running:
+            watcher.start()
+        elif not auto_train and watcher.running:
+            watcher.stop()
+        if watcher.last_result is not None:
+            updated = datetime.datetime.fromtimestamp(watcher.last_update).strftime("%H:%M:%S")
+            st.caption(f"Last background update at {updated}: {watcher.last_result[1]}")
 
 elif page == "Mark Attendance":
     st.title("Mark Attendance")
@@ -207,23 +220,15 @@ elif page == "Mark Attendance":
         st.markdown("### Results")
         if st.button("Mark Present"):
             if subject and img_file:
-                success, result = recognize_from_image(img_file)
+                success, result = recognize_from_image(img_file, db.get_roster(subject), subject)
                 if success:
                     if result:
-                        present_names = []
-                        for enroll in set(result):
-                            # Fetch name
-                            rows = db.get_student_details()
-                            student_name = "Unknown"
-                            for r in rows: 
-                                if str(r[0]) == str(enroll):
-                                    student_name = r[1]
-                                    break
-                            
-                            db.mark_attendance(enroll, student_name, subject)
-                            present_names.append(student_name)
+                        present_names = [name for _, name in db.mark_attendance_bulk(subject, result)]
                         
-                        st.success(f"✅ Marked Present: {', '.join(present_names)}")
+                        if present_names:
+                            st.success(f"✅ Marked Present: {', '.join(present_names)}")
+                        else:
+                            st.info("Everyone recognized is already marked present today.")
                     else:
                         st.warning("⚠️ Face not recognized.")
                 else:
@@ -233,13 +238,39 @@ elif page == "Mark Attendance":
 
 elif page == "View Records":
     st.title("Attendance Records")
-    subject_filter = st.text_input("Filter by Subject")
+    col1, col2, col3 = st.columns(3)
+    subject_filter = col1.text_input("Filter by Subject")
+    enrollment_filter = col2.text_input("Filter by Enrollment (optional)")
+    date_range = col3.date_input("Date range (optional)", value=())
     if subject_filter:
-        data = db.get_attendance_log(subject_filter)
+        filters = {"enrollment": enrollment_filter or None}
+        if len(date_range) == 2:
+            filters["start_date"] = date_range[0].strftime('%Y-%m-%d')
+            filters["end_date"] = date_range[1].strftime('%Y-%m-%d')
+
+        # Only the current page is fetched; the cursors of earlier pages are kept so
+        # "Previous" is a keyset query too. New filters start again from the first page.
+        page_key = (subject_filter, tuple(sorted(filters.items())))
+        if st.session_state.get("records_key") != page_key:
+            st.session_state.records_key = page_key
+            st.session_state.records_cursors = [0]
+        cursors = st.session_state.records_cursors
+
+        columns = ["enrollment", "name", "date", "time"]
+        data, next_after_id = db.get_attendance_page(subject_filter, cursors[-1], 50, columns, **filters)
         if data:
             # Convert to DataFrame for nicer display
-            df = pd.DataFrame(data, columns=["ID", "Enrollment", "Name", "Subject", "Date", "Time"])
+            df = pd.DataFrame(data, columns=["Enrollment", "Name", "Date", "Time"])
             st.dataframe(df, use_container_width=True)
+
+            prev_col, page_col, next_col = st.columns([1, 2, 1])
+            page_col.caption(f"Page {len(cursors)}")
+            if prev_col.button("Previous", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+            if next_col.button("Next", disabled=next_after_id is None):
+                cursors.append(next_after_id)
+                st.rerun()
         else:
             st.info("No records found.")
     else:
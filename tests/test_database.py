@@ -0,0 +1,108 @@
+import sqlite3
+
+from src.database import DatabaseManager
+
+
+def _old_database(path):
+    # Schema as created before migrations existed (user_version 0), with a student
+    # marked twice for the same subject and day
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE students (enrollment TEXT PRIMARY KEY, name TEXT NOT NULL, "
+                 "registered_date TEXT, registered_time TEXT)")
+    conn.execute("CREATE TABLE attendance (id INTEGER PRIMARY KEY AUTOINCREMENT, enrollment TEXT, name TEXT, "
+                 "subject TEXT, date TEXT, time TEXT)")
+    conn.executemany("INSERT INTO students VALUES (?, ?, '2024-01-01', '09:00:00')", [("1", "Ann"), ("2", "Bob")])
+    conn.executemany("INSERT INTO attendance (enrollment, name, subject, date, time) VALUES (?, ?, ?, ?, ?)", [
+        ("1", "Ann", "Maths", "2024-01-02", "09:00:00"),
+        ("1", "Ann", "Maths", "2024-01-02", "09:05:00"),
+        ("2", "Bob", "Maths", "2024-01-02", "09:01:00"),
+        ("1", "Ann", "Maths", "2024-01-03", "09:00:00"),
+        ("1", "Ann", "Physics", "2024-01-02", "11:00:00"),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def _insert(path, rows):
+    # Written with a plain connection, like an external tool would; the triggers still
+    # keep the summary tables current
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany("INSERT INTO attendance (enrollment, name, subject, date, time) VALUES (?, ?, ?, ?, ?)",
+                         rows)
+    conn.close()
+
+
+def test_migration_keeps_first_mark_of_each_session(tmp_path):
+    path = str(tmp_path / "attendance.db")
+    _old_database(path)
+    db = DatabaseManager(path)
+
+    rows = db.get_attendance_page(columns=["enrollment", "subject", "date", "time"])[0]
+    assert rows == [("1", "Maths", "2024-01-02", "09:00:00"), ("2", "Maths", "2024-01-02", "09:01:00"),
+                    ("1", "Maths", "2024-01-03", "09:00:00"), ("1", "Physics", "2024-01-02", "11:00:00")]
+    # Backfilled summaries count the deduplicated rows
+    assert db.get_daily_counts("Maths") == [("2024-01-02", "Maths", 2), ("2024-01-03", "Maths", 1)]
+    assert [row[:4] for row in db.get_student_attendance("Maths")] == [("1", "Ann", 2, 2), ("2", "Bob", 1, 2)]
+
+    # Migrations run once; reopening leaves the data alone
+    db.close()
+    reopened = DatabaseManager(path)
+    assert len(reopened.get_attendance_page()[0]) == 4
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+    conn.close()
+
+
+def test_summary_tables_follow_inserts_and_deletes(tmp_path):
+    path = str(tmp_path / "attendance.db")
+    db = DatabaseManager(path)
+    _insert(path, [("1", "Ann", "Maths", "2024-01-02", "09:00:00"),
+                   ("2", "Bob", "Maths", "2024-01-02", "09:01:00"),
+                   ("1", "Ann", "Maths", "2024-01-03", "09:00:00")])
+    assert db.get_daily_counts("Maths") == [("2024-01-02", "Maths", 2), ("2024-01-03", "Maths", 1)]
+    assert [row[:4] for row in db.get_student_attendance("Maths")] == [("1", "", 2, 2), ("2", "", 1, 2)]
+
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("DELETE FROM attendance WHERE enrollment = '1' AND date = '2024-01-03'")
+        conn.execute("DELETE FROM attendance WHERE enrollment = '2'")
+    conn.close()
+    # Days and students that drop to zero disappear from the summaries
+    assert db.get_daily_counts("Maths") == [("2024-01-02", "Maths", 1)]
+    assert [row[:4] for row in db.get_student_attendance("Maths")] == [("1", "", 1, 1)]
+    assert db.get_subjects() == ["Maths"]
+
+
+def test_attendance_page_cursor_boundaries(tmp_path):
+    path = str(tmp_path / "attendance.db")
+    db = DatabaseManager(path)
+    _insert(path, [(str(n), f"Student {n}", "Maths", "2024-01-02", "09:00:00") for n in range(4)]
+            + [("9", "Other", "Physics", "2024-01-02", "09:00:00")])
+
+    first, after_id = db.get_attendance_page("Maths", limit=2, columns=["enrollment"])
+    assert first == [("0",), ("1",)] and after_id == 2
+    # A last page that is exactly full has no next cursor
+    second, after_id = db.get_attendance_page("Maths", after_id=after_id, limit=2, columns=["enrollment"])
+    assert second == [("2",), ("3",)] and after_id is None
+    assert db.get_attendance_page("Maths", after_id=4, limit=2) == ([], None)
+    assert db.get_attendance_page("Maths", limit=4)[1] is None
+    assert db.get_attendance_page("Maths", limit=3)[1] == 3
+
+    # Streaming in chunks smaller than the log yields every row once
+    assert [row[0] for row in db.iter_attendance_log("Maths", columns=["enrollment"], chunk_size=3)] == \
+        ["0", "1", "2", "3"]
+
+
+def test_bulk_marking_skips_unknown_enrollments(tmp_path):
+    db = DatabaseManager(str(tmp_path / "attendance.db"))
+    db.add_student("1", "Ann")
+    db.add_student("2", "Bob")
+
+    marked = db.mark_attendance_bulk("Maths", ["1", "999", "2", "1"])
+    assert marked == [("1", "Ann"), ("2", "Bob")]
+    assert sorted(row[0] for row in db.get_attendance_page("Maths", columns=["enrollment"])[0]) == ["1", "2"]
+    assert db.mark_attendance_bulk("Maths", ["999"]) == []
+    # Students already marked today are not reported again
+    db.add_student("3", "Cy")
+    assert db.mark_attendance_bulk("Maths", ["1", "3"]) == [("3", "Cy")]
@@ -0,0 +1,35 @@
+import numpy as np
+
+from src.gallery_index import CentroidIndex, measure_recall
+from src.lbph import NumpyLBPH
+
+
+def _synthetic_engine(identities=40, samples=8, seed=0):
+    # Histogram-like rows: one random prototype per identity plus heavy per-sample noise
+    # (so identities overlap and the index can miss), normalised per cell like LBPH
+    # histograms. Returns the engine and held-out queries.
+    rng = np.random.default_rng(seed)
+    engine = NumpyLBPH(grid_x=4, grid_y=4)
+    cells, bins = engine.grid_x * engine.grid_y, engine.feature_size // (engine.grid_x * engine.grid_y)
+
+    def rows(prototypes, count):
+        noisy = prototypes[:, None] * rng.gamma(0.25, 4.0, (len(prototypes), count, cells, bins))
+        noisy /= noisy.sum(axis=-1, keepdims=True)
+        return noisy.reshape(-1, engine.feature_size).astype(np.float32)
+
+    prototypes = rng.gamma(5.0, 1.0, (identities, cells, bins))
+    labels = np.repeat(np.arange(1000, 1000 + identities), samples)
+    engine.set_gallery(rows(prototypes, samples), labels)
+    return engine, rows(prototypes, 2)
+
+
+def test_recall_at_default_probes():
+    engine, queries = _synthetic_engine()
+    index = CentroidIndex.build(engine, n_probe=8)
+    assert measure_recall(engine, index, queries)["recall"] >= 0.85
+
+
+def test_probing_every_identity_is_exhaustive():
+    engine, queries = _synthetic_engine()
+    index = CentroidIndex.build(engine, n_probe=len(np.unique(engine.labels)))
+    assert measure_recall(engine, index, queries)["recall"] == 1.0
@@ -1,7 +1,7 @@
 import cv2
 import os
 import numpy as np
-from PIL import Image
+from src.face_cache import FaceCache, cached_faces
 #
 # recognizer = cv2.face.LBPHFaceRecognizer_create()
 recognizer = cv2.face.LBPHFaceRecognizer_create()
@@ -9,6 +9,7 @@ detector = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
 
 
 def getImagesAndLabels(path):
+    cache = FaceCache("TrainingImageLabel/face_cache")
     # get the path of all the files in the folder
     imagePaths = [os.path.join(path, f) for f in os.listdir(path)]
     # create empth face list
@@ -17,18 +18,11 @@ def getImagesAndLabels(path):
     Ids = []
     # now looping through all the image paths and loading the Ids and the images
     for imagePath in imagePaths:
-        # loading the image and converting it to gray scale
-        pilImage = Image.open(imagePath).convert('L')
-        # Now we are converting the PIL image into numpy array
-        imageNp = np.array(pilImage, 'uint8')
         # getting the Id from the image
-
         Id = int(os.path.split(imagePath)[-1].split(".")[1])
-        # extract the face from the training image sample
-        faces = detector.detectMultiScale(imageNp)
-        # If a face is there then append that in the list as well as Id of it
-        for (x, y, w, h) in faces:
-            faceSamples.append(imageNp[y:y+h, x:x+w])
+        # extract the face from the training image sample, reusing the crop cache when the file is unchanged
+        for face in cached_faces(imagePath, detector, cache):
+            faceSamples.append(face)
             Ids.append(Id)
     return faceSamples, Ids
 